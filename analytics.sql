@@ -33,6 +33,28 @@ CREATE TABLE IF NOT EXISTS invoices (
     file TEXT
 );
 
+-- Invoices already loaded, one row per (supplier_name, invoice_number).
+-- insert_dataframe claims new keys here with INSERT ... ON CONFLICT
+-- (supplier_name, invoice_number) DO NOTHING and only loads the line items of
+-- the invoices it claimed, so a reload is skipped while repeated identical
+-- lines of one invoice are all kept. NULLS NOT DISTINCT needs PostgreSQL 15+.
+CREATE TABLE IF NOT EXISTS invoices_keys (
+    supplier_name TEXT,
+    invoice_number VARCHAR(50)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS invoices_keys_unique
+    ON invoices_keys (supplier_name, invoice_number)
+    NULLS NOT DISTINCT;
+
+-- Existing databases: register the invoices loaded so far and drop the old
+-- line-level key, which collapsed repeated identical lines.
+INSERT INTO invoices_keys (supplier_name, invoice_number)
+SELECT DISTINCT supplier_name, invoice_number FROM invoices
+ON CONFLICT (supplier_name, invoice_number) DO NOTHING;
+
+DROP INDEX IF EXISTS invoices_natural_key;
+
 
 -- ===========================================================
 -- 🧹 2. Maintenance Commands (Use with Caution)
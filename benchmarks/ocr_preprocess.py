@@ -0,0 +1,71 @@
+"""
+OCR time and word agreement with / without image preprocessing.
+
+    python benchmarks/ocr_preprocess.py [image_dir] [--repeat N]
+
+For each image, runs read_bbox_and_words on the full-resolution RGB image
+(current behaviour) and with DEFAULT_OCR_PREPROCESS, and prints the OCR
+seconds of each plus the share of the baseline words (as a multiset) that
+the preprocessed run also found.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lib.ocr_utils import *
+
+
+def _words(df):
+    words = df["line"].dropna().astype(str).str.strip()
+    return Counter(w for w in words if w)
+
+
+def _timed(path, repeat, preprocess):
+    best, df = None, None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        df = read_bbox_and_words(path, preprocess=preprocess)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image_dir", nargs="?", default="data/company-A/raw")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.image_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    if not paths:
+        print(f"⚠️ No images found in {args.image_dir}")
+        return
+
+    rows = []
+    for path in paths:
+        t_base, df_base = _timed(path, args.repeat, None)
+        t_prep, df_prep = _timed(path, args.repeat, True)
+        base, prep = _words(df_base), _words(df_prep)
+        agreement = sum((base & prep).values()) / sum(base.values()) if base else None
+        rows.append({
+            "image": path.name,
+            "baseline_s": round(t_base, 3),
+            "preprocessed_s": round(t_prep, 3),
+            "speedup": round(t_base / t_prep, 2) if t_prep else None,
+            "baseline_words": sum(base.values()),
+            "preprocessed_words": sum(prep.values()),
+            "word_agreement": round(agreement, 3) if agreement is not None else None,
+        })
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    print(f"\n⏱️ mean OCR s/image: baseline={df['baseline_s'].mean():.3f} "
+          f"preprocessed={df['preprocessed_s'].mean():.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Peak memory of reading a long PDF with and without per-page cache release.
+
+    python benchmarks/pdf_memory.py [--pages 500 50] [--rows 45]
+
+Writes a synthetic bid-tabulation-like PDF per page count (plain PDF syntax,
+no extra dependencies), then reads it in a fresh process each time:
+  keep_open:  plain pdfplumber loop, extract_text on every page (pages keep their caches)
+  streaming:  Document.iter_pages (each page's caches are released once its text is taken)
+and prints the peak RSS of each run.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def write_synthetic_pdf(path, n_pages, rows_per_page=45):
+    """A letter-size PDF of n_pages pages of bid-tab style rows (Helvetica text)."""
+    objects = []  # object bodies, 1-based ids in order
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)  # filled in once the page tree exists
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for p in range(n_pages):
+        lines = [b"BT /F1 9 Tf 36 756 Td 11 TL"]
+        lines.append(f"(BID TABULATION - CONTRACT DA{p:05d} - PAGE {p + 1}) Tj T*".encode())
+        for r in range(rows_per_page):
+            item = p * rows_per_page + r + 1
+            row = (f"{item:04d} {item:07d}000-E SECTION {r % 9 + 1} ITEM DESCRIPTION {item} "
+                   f"{r * 3 + 10} LS {r * 1.25 + 10:,.2f} {r * 37.5 + 100:,.2f} {r * 36.0 + 95:,.2f}")
+            lines.append(f"({row}) Tj T*".encode())
+        lines.append(b"ET")
+        stream = b"\n".join(lines)
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % n_pages
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_at)
+    Path(path).write_bytes(bytes(out))
+
+
+def _measure(mode, path):
+    """Runs in a child process: read the PDF, report line count, seconds and peak RSS."""
+    t = time.perf_counter()
+    n_lines = 0
+    if mode == "keep_open":
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text()
+                n_lines += len(text.split("\n")) if text else 0
+    else:
+        from lib.document import Document
+        with Document(path) as doc:
+            for _, lines in doc.iter_pages():
+                n_lines += len(lines)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+    print(json.dumps({"lines": n_lines, "seconds": round(time.perf_counter() - t, 2),
+                      "peak_rss_mb": round(peak_kb / 1024, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--rows", type=int, default=45)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pdf_memory_") as tmp:
+        for n_pages in args.pages:
+            path = Path(tmp) / f"synthetic_{n_pages}.pdf"
+            write_synthetic_pdf(path, n_pages, rows_per_page=args.rows)
+            size_mb = path.stat().st_size / 1024 ** 2
+            for mode in ("keep_open", "streaming"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, str(path)],
+                    capture_output=True, text=True, check=True, cwd=ROOT,
+                )
+                res = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{n_pages:>5} pages ({size_mb:.1f} MB)  {mode:<10} "
+                      f"peak RSS {res['peak_rss_mb']:>7.1f} MB  {res['seconds']:>6.2f}s  {res['lines']} lines")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -1,73 +1,321 @@
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import pool as pg_pool
 import pandas as pd
 import pathlib
 import numpy as np
 
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+# Low-cardinality text columns stored as pandas categoricals by iter_dataframe.
+COMPACT_CATEGORY_COLUMNS = ("supplier_name", "country")
+
+# An invoice already loaded is skipped as a whole by insert_dataframe; its line
+# items (identical lines included) all go in the first time it's seen.
+INVOICE_KEY_COLUMNS = ("supplier_name", "invoice_number")
+
+
+def compact_dtypes(df, category_columns=COMPACT_CATEGORY_COLUMNS):
+    """
+    Shrink a query result in place:
+    - category_columns → category
+    - DATE columns (python date objects) → datetime64
+    - float64 columns → float32 only when every value survives the round trip
+      exactly (qty-like columns), money columns with cents stay float64
+    The choices depend on this frame's values only (see iter_dataframe).
+    """
+    for col in df.columns:
+        s = df[col]
+        if col in category_columns:
+            df[col] = s.astype("category")
+        elif s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) == "date":
+            df[col] = pd.to_datetime(s)
+        elif s.dtype == np.float64:
+            f32 = s.astype(np.float32)
+            same = (f32.astype(np.float64) == s) | s.isna()
+            if same.all():
+                df[col] = f32
+    return df
+
+
+def db_settings_from_env(**overrides):
+    """
+    Connection settings from the DB_* environment variables (or a .env file),
+    falling back to the local development defaults. Non-None overrides win.
+    """
+    settings = {
+        "dbname": os.getenv("DB_NAME", "postgres"),
+        "user": os.getenv("DB_USER", "mauricio"),
+        "password": os.getenv("DB_PASSWORD", "12345"),
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+    }
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def prepare_dataframe_for_copy(df):
+    """
+    Column-wise (vectorized) cleanup before loading into Postgres:
+    - object columns holding Path (or other non-string) objects → str, NULLs kept
+    - float columns holding only whole numbers → nullable Int64, so INT columns
+      don't receive values like "1.0"
+    """
+    df = df.copy()
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            kind = pd.api.types.infer_dtype(s, skipna=True)
+            if kind not in ("string", "empty", "integer", "floating", "mixed-integer-float",
+                            "boolean", "date", "datetime", "decimal"):
+                notna = s.notna()
+                df[col] = s.where(~notna, s.astype(str))
+        elif pd.api.types.is_float_dtype(s):
+            values = s.dropna()
+            if len(values) and (values % 1 == 0).all():
+                df[col] = s.astype("Int64")
+    return df
+
 class postgres:
     def __init__(self,
-                 db_name="postgres",
-                 user="mauricio",
-                 password="12345",
-                 host="localhost",
-                 port="5432"):
-        """Initialize PostgreSQL connection."""
+                 db_name=None,
+                 user=None,
+                 password=None,
+                 host=None,
+                 port=None,
+                 pool_size=None):
+        """
+        Initialize PostgreSQL connection.
+
+        Settings come from the arguments, then the DB_* env vars, then local defaults.
+        pool_size: when set, keep a bounded pool of connections instead of a single
+                   shared one; each operation checks a connection out through
+                   connection(), so the object can be used from several threads.
+                   (Worker processes should each create their own postgres().)
+        """
+        self.settings = db_settings_from_env(
+            dbname=db_name, user=user, password=password, host=host, port=port
+        )
+        self.conn = None
+        self.pool = None
+        self._slots = None
         try:
-            self.conn = psycopg2.connect(
-                dbname=db_name,
-                user=user,
-                password=password,
-                host=host,
-                port=port
-            )
-            self.conn.autocommit = True
-            print(f"✅ Connected successfully to PostgreSQL database: {db_name}")
+            if pool_size:
+                self.pool = pg_pool.ThreadedConnectionPool(1, pool_size, **self.settings)
+                # getconn() raises when the pool is exhausted; make callers wait instead
+                self._slots = threading.BoundedSemaphore(pool_size)
+                print(f"✅ Connection pool (max {pool_size}) ready for PostgreSQL database: {self.settings['dbname']}")
+            else:
+                self.conn = psycopg2.connect(**self.settings)
+                self.conn.autocommit = True
+                print(f"✅ Connected successfully to PostgreSQL database: {self.settings['dbname']}")
         except Exception as e:
             print(f"❌ Failed to connect: {e}")
 
+    @staticmethod
+    def _is_healthy(conn):
+        if conn.closed:
+            return False
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for one operation.
+        Single-connection mode just yields the shared connection.
+        """
+        if self.pool is None:
+            yield self.conn
+            return
+
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            if not self._is_healthy(conn):
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                conn.autocommit = True
+            yield conn
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
     def fetch_dataframe(self, query):
         """Run a SELECT query and return a DataFrame."""
         try:
-            return pd.read_sql_query(query, self.conn)
+            with self.connection() as conn:
+                return pd.read_sql_query(query, conn)
         except Exception as e:
             print(f"❌ Error executing query: {e}")
             return pd.DataFrame()
 
-    def insert_dataframe(self, df, table_name="invoices"):
+    def iter_dataframe(self, query, params=None, chunk_size=50_000, compact=True):
+        """
+        Stream a SELECT through a named (server-side) cursor, yielding DataFrames
+        of at most chunk_size rows, so large results are read in bounded memory.
+        compact=True applies compact_dtypes to each chunk on its own, so chunks
+        don't share dtypes: each has its own categories (codes can't be compared
+        across chunks) and a float column may be float32 in one chunk and
+        float64 in the next. pd.concat of the chunks falls back to object /
+        float64 there; run compact_dtypes again on the combined frame, or read
+        with compact=False, when chunks are meant to be combined.
+        """
+        with self.connection() as conn:
+            conn.autocommit = False  # named cursors live inside a transaction
+            try:
+                with conn.cursor(name=f"etl_stream_{id(conn)}_{time.monotonic_ns()}") as cur:
+                    cur.itersize = chunk_size
+                    cur.execute(query, params)
+                    while True:
+                        rows = cur.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        df = pd.DataFrame(rows, columns=[d.name for d in cur.description])
+                        yield compact_dtypes(df) if compact else df
+            finally:
+                conn.rollback()
+                conn.autocommit = True
+
+    def insert_dataframe(self, df, table_name="invoices", batch_size=50_000, return_counts=False,
+                         key_columns=INVOICE_KEY_COLUMNS):
+        """
+        Load new invoices, letting Postgres drop the ones already loaded.
+
+        The batch is COPY'd into a temporary staging table. Its distinct
+        key_columns values go into {table_name}_keys with
+        INSERT ... ON CONFLICT (key_columns) DO NOTHING, and only the staged rows
+        whose key was new are moved into the table (see analytics.sql). Rows of
+        one invoice are never deduplicated against each other, so repeated
+        identical line items are kept; a missing keys table or unique index is
+        an error rather than a silent no-op. Cost only depends on the size of
+        the incoming batch.
+
+        Returns the number of inserted rows (-1 on failure), or
+        (inserted, skipped) when return_counts=True.
+        """
+        if df.empty:
+            print("❌ No new invoices to upload — empty DataFrame.")
+            return (0, 0) if return_counts else 0
+
+        stage = f"_stage_{table_name}"
+        with self.connection() as conn:
+            try:
+                return self._insert_via_stage(conn, df, table_name, stage, batch_size, return_counts,
+                                              key_columns)
+            except Exception as e:
+                print(f"❌ Error inserting data: {e}")
+                return (-1, 0) if return_counts else -1  # <-- indicate failure
+
+    def _insert_via_stage(self, conn, df, table_name, stage, batch_size, return_counts, key_columns):
+        missing = [c for c in key_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"key column(s) {missing} not in the DataFrame")
+        df = prepare_dataframe_for_copy(df)
+        cols = ', '.join(df.columns)
+        keys = ', '.join(key_columns)
+        staged_key = ', '.join(f"s.{c}" for c in key_columns)
+        new_key = ', '.join(f"k.{c}" for c in key_columns)
+
+        start = time.perf_counter()
+        conn.autocommit = False
         try:
-            df = df.where(pd.notnull(df), None)
-            df = df.map(lambda x: str(x) if isinstance(x, pathlib.PurePath) else x)
-
-            with self.conn.cursor() as cur:
-                cur.execute(f"SELECT invoice_number, supplier_name FROM {table_name}")
-                existing = {(i, s) for i, s in cur.fetchall()}
-
-            before_count = len(df)
-            df_to_insert = df[
-                ~df.apply(lambda x: (x["invoice_number"], x["supplier_name"]) in existing, axis=1)
-            ].copy()
-            new_count = len(df_to_insert)
-
-            if new_count == 0:
-                print("❌ No new invoices to upload — all records already exist.")
-                return 0  # <-- no new rows
-
-            with self.conn.cursor() as cur:
-                cols = ', '.join(df_to_insert.columns)
-                placeholders = ', '.join(['%s'] * len(df_to_insert.columns))
-                query = f"INSERT INTO {table_name} ({cols}) VALUES ({placeholders})"
-                for _, row in df_to_insert.iterrows():
-                    cur.execute(query, tuple(row))
-
-            self.conn.commit()
-            print(f"✅ Inserted {new_count} new rows into '{table_name}' (skipped {before_count - new_count} duplicates).")
-            return new_count  # <-- return real number inserted
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                    f"SELECT {cols} FROM {table_name} WITH NO DATA"
+                )
+                self._copy_into(cur, df, stage, batch_size)
+                # ROW(...)::text compares keys NULL-safely and still allows a hash join
+                cur.execute(
+                    f"WITH new_keys AS ("
+                    f"INSERT INTO {table_name}_keys ({keys}) SELECT DISTINCT {keys} FROM {stage} "
+                    f"ON CONFLICT ({keys}) DO NOTHING RETURNING {keys}) "
+                    f"INSERT INTO {table_name} ({cols}) "
+                    f"SELECT {', '.join(f's.{c}' for c in df.columns)} FROM {stage} s "
+                    f"JOIN new_keys k ON ROW({staged_key})::text = ROW({new_key})::text"
+                )
+                inserted = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        elapsed = time.perf_counter() - start
 
-        except Exception as e:
-            print(f"❌ Error inserting data: {e}")
-            self.conn.rollback()
-            return -1  # <-- indicate failure
+        skipped = len(df) - inserted
+        rate = len(df) / elapsed if elapsed > 0 else float("inf")
+        if inserted == 0:
+            print("❌ No new invoices to upload — all records already exist.")
+        else:
+            print(f"✅ Inserted {inserted} new rows into '{table_name}' (skipped {skipped} duplicates) "
+                  f"in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+        return (inserted, skipped) if return_counts else inserted
+
+    @staticmethod
+    def _copy_into(cur, df, table_name, batch_size):
+        """COPY df into table_name on an open cursor, batch_size rows at a time (no commit)."""
+        cols = ', '.join(df.columns)
+        query = f"COPY {table_name} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        copied = 0
+        for offset in range(0, len(df), batch_size):
+            batch = df.iloc[offset:offset + batch_size]
+            buf = io.StringIO()
+            batch.to_csv(buf, index=False, header=False, na_rep="\\N")
+            buf.seek(0)
+            cur.copy_expert(query, buf)
+            copied += len(batch)
+        return copied
+
+    def copy_dataframe(self, df, table_name="invoices", batch_size=50_000):
+        """
+        Bulk load a DataFrame with COPY ... FROM STDIN, batch_size rows at a time.
+        All batches go in one transaction: a failure loads nothing.
+        Returns the number of rows copied (-1 on failure).
+        """
+        if df.empty:
+            return 0
+        with self.connection() as conn:
+            try:
+                df = prepare_dataframe_for_copy(df)
+
+                start = time.perf_counter()
+                conn.autocommit = False
+                try:
+                    with conn.cursor() as cur:
+                        copied = self._copy_into(cur, df, table_name, batch_size)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
 
+                elapsed = time.perf_counter() - start
+                rate = copied / elapsed if elapsed > 0 else float("inf")
+                print(f"⚡ Copied {copied} rows into '{table_name}' in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+                return copied
 
+            except Exception as e:
+                print(f"❌ Error copying data: {e}")
+                return -1
 
     def invoice_exists(self, company_id, invoice_number, invoice_date):
         """Check if an invoice already exists for a given company, date, and invoice number."""
@@ -79,7 +327,7 @@ class postgres:
                 AND invoice_number = %s
                 AND invoice_date = %s
             """
-            with self.conn.cursor() as cur:
+            with self.connection() as conn, conn.cursor() as cur:
                 cur.execute(query, (company_id, invoice_number, invoice_date))
                 result = cur.fetchone()
             return result and result[0] > 0
@@ -90,6 +338,9 @@ class postgres:
 
 
     def close(self):
-        """Close the database connection."""
-        self.conn.close()
+        """Close the database connection (or every pooled connection)."""
+        if self.pool is not None:
+            self.pool.closeall()
+        elif self.conn is not None:
+            self.conn.close()
         print("🔒 Connection closed.")
@@ -0,0 +1,268 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytesseract
+
+
+# Bump whenever the text extraction logic changes so stale entries are ignored.
+# 2: pages are probed first and hybrid pages merge native + OCR lines.
+EXTRACTOR_VERSION = "2"
+
+DEFAULT_CACHE_DIR = Path(".cache")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash a file's content in chunks (no need to load it all in memory)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache with size-bounded LRU eviction.
+    Entries are plain files under cache_dir/<key[:2]>/<key>; a hit refreshes the
+    file's mtime, and the least recently used files are removed once the total
+    size goes over max_bytes. With max_age (seconds) set, entries not used for
+    that long are dropped on the next eviction as well. Safe to share between
+    threads (e.g. the OCR page pool).
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 ** 2, max_age=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._size = None
+        self._digests = {}  # (path, mtime_ns, size) → file_sha256
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # locks can't be pickled (the cache is shipped to worker processes)
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def file_digest(self, path):
+        """file_sha256 of path, computed once per file version (path, mtime, size)."""
+        path = Path(path).resolve()
+        st = path.stat()
+        version = (str(path), st.st_mtime_ns, st.st_size)
+        digest = self._digests.get(version)
+        if digest is None:
+            digest = self._digests[version] = file_sha256(path)
+        return digest
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str):
+        """Return the cached bytes for key, or None."""
+        path = self._entry_path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes):
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            replaced = path.stat().st_size  # overwriting an entry doesn't grow the cache
+        except OSError:
+            replaced = 0
+
+        # write to a temp file first so concurrent readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size_bytes()
+            else:
+                self._size += len(data) - replaced
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        entries = []
+        for p in self.cache_dir.glob("*/*"):
+            if p.suffix == ".tmp":
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - self.max_age if self.max_age else None
+            removed = 0
+            for mtime, size, p in entries:
+                expired = cutoff is not None and mtime < cutoff
+                if total <= self.max_bytes and not expired:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                    removed += 1
+                except OSError:
+                    continue
+            self._size = total
+        return removed
+
+    def clear(self):
+        with self._lock:
+            for _, _, p in self._entries():
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            self._size = 0
+
+
+class ExtractionCache(DiskCache):
+    """
+    Cache of per-page text lines extracted from a PDF, keyed by the file content
+    hash + EXTRACTOR_VERSION + extraction variant (e.g. "native" or "ocr").
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR / "extraction", max_bytes=512 * 1024 ** 2):
+        super().__init__(cache_dir, max_bytes=max_bytes)
+
+    def key(self, path, variant: str) -> str:
+        raw = f"{self.file_digest(path)}:{EXTRACTOR_VERSION}:{variant}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_pages(self, key: str):
+        """Return the cached list of per-page line lists, or None on a miss."""
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+    def set_pages(self, key: str, pages):
+        payload = json.dumps(pages, ensure_ascii=False).encode("utf-8")
+        self.set(key, payload)
+
+
+class OcrCache(DiskCache):
+    """
+    Persistent cache of tesseract results (word/bbox DataFrames and plain text),
+    keyed by the image bytes hash + tesseract version + lang + config.
+    Keeps hit/miss counters for the current process.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR / "ocr", max_bytes=1024 ** 3, max_age=30 * 24 * 3600):
+        super().__init__(cache_dir, max_bytes=max_bytes, max_age=max_age)
+        self.hits = 0
+        self.misses = 0
+        self._tesseract_version = None
+
+    @property
+    def tesseract_version(self):
+        if self._tesseract_version is None:
+            try:
+                self._tesseract_version = str(pytesseract.get_tesseract_version())
+            except Exception:
+                self._tesseract_version = "unknown"
+        return self._tesseract_version
+
+    @staticmethod
+    def image_digest(image):
+        """sha256 of a PIL image's pixels (mode and size included)."""
+        h = hashlib.sha256()
+        h.update(f"{image.mode}:{image.size}".encode("utf-8"))
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def key(self, digest: str, kind: str, lang=None, config="") -> str:
+        raw = f"{digest}:{kind}:{self.tesseract_version}:{lang or ''}:{config or ''}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_data(self, key: str):
+        """Cached image_to_data DataFrame, or None."""
+        data = self.get(key)
+        self._count(data is not None)
+        if data is None:
+            return None
+        return pd.read_json(io.StringIO(data.decode("utf-8")), orient="split", dtype=False)
+
+    def set_data(self, key: str, df: pd.DataFrame):
+        self.set(key, df.to_json(orient="split", index=False).encode("utf-8"))
+
+    def image_to_data(self, image, lang=None, config="", digest=None):
+        """pytesseract.image_to_data (DATAFRAME output) going through the cache."""
+        key = self.key(digest or self.image_digest(image), "data", lang, config)
+        df = self.get_data(key)
+        if df is None:
+            df = pytesseract.image_to_data(
+                image, lang=lang, config=config, output_type=pytesseract.Output.DATAFRAME
+            )
+            self.set_data(key, df)
+        return df
+
+    def image_to_string(self, image, lang=None, config="", digest=None):
+        """pytesseract.image_to_string going through the cache."""
+        key = self.key(digest or self.image_digest(image), "string", lang, config)
+        data = self.get(key)
+        self._count(data is not None)
+        if data is not None:
+            return data.decode("utf-8")
+        text = pytesseract.image_to_string(image, lang=lang, config=config)
+        self.set(key, text.encode("utf-8"))
+        return text
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "size_bytes": self.size_bytes(),
+        }
@@ -0,0 +1,421 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+
+import pandas as pd
+import pdfplumber
+import pytesseract
+
+
+# Max number of leading pages the parser of each doc type needs.
+# Doc types not listed here get every page.
+PAGE_BUDGETS = {
+    "nc_award_letter": 1,
+    "nc_invitation_to_bid": 2,
+}
+
+
+class TextLines(list):
+    """
+    List of text lines that also keeps the strings derived from it (joined text,
+    its lowercase form, non-empty stripped lines), each computed once on first use.
+    Parsers accept it wherever a plain text_list is expected; treat it as read-only.
+    """
+
+    @cached_property
+    def full_text(self):
+        return "\n".join(self)
+
+    @cached_property
+    def lower_text(self):
+        return self.full_text.lower()
+
+    @cached_property
+    def stripped(self):
+        """Stripped lines, empty ones dropped."""
+        return [l.strip() for l in self if l and l.strip()]
+
+
+def full_text_of(text_list):
+    """"\n".join(text_list), reused when text_list is a TextLines."""
+    if isinstance(text_list, TextLines):
+        return text_list.full_text
+    return "\n".join(text_list)
+
+
+def lower_text_of(text_list):
+    if isinstance(text_list, TextLines):
+        return text_list.lower_text
+    return "\n".join(text_list).lower()
+
+
+def stripped_lines_of(text_list):
+    if isinstance(text_list, TextLines):
+        return text_list.stripped
+    return [l.strip() for l in text_list if l and l.strip()]
+
+
+# Text-layer probe thresholds (see probe_page)
+MIN_NATIVE_CHARS = 20
+OCR_IMAGE_COVERAGE = 0.5
+
+
+def probe_page(page, min_chars=MIN_NATIVE_CHARS, image_coverage=OCR_IMAGE_COVERAGE):
+    """
+    Decide how to read a pdfplumber page from its char / image objects, without
+    running extract_text:
+      "ocr":    no text layer at all
+      "hybrid": a few chars over a page mostly covered by images (stamp or
+                header on a scan) → native text plus OCR
+      "native": anything else
+    Returns a dict with chars, image_coverage and mode.
+    """
+    n_chars = len(page.chars)
+    page_area = float(page.width * page.height) or 1.0
+    covered = 0.0
+    for img in page.images:
+        x0, x1 = max(img["x0"], page.bbox[0]), min(img["x1"], page.bbox[2])
+        top, bottom = max(img["top"], page.bbox[1]), min(img["bottom"], page.bbox[3])
+        if x1 > x0 and bottom > top:
+            covered += (x1 - x0) * (bottom - top)
+    coverage = min(1.0, covered / page_area)
+
+    if n_chars == 0:
+        mode = "ocr"
+    elif n_chars < min_chars and coverage >= image_coverage:
+        mode = "hybrid"
+    else:
+        mode = "native"
+    return {"chars": n_chars, "image_coverage": round(coverage, 3), "mode": mode}
+
+
+def prescan_corpus(paths, min_chars=MIN_NATIVE_CHARS, image_coverage=OCR_IMAGE_COVERAGE):
+    """
+    Probe every page of every PDF in paths. Returns one row per page
+    (path, page, chars, image_coverage, mode) and prints pages/files per mode.
+    """
+    rows = []
+    for path in paths:
+        try:
+            with pdfplumber.open(path) as pdf:
+                for i, page in enumerate(pdf.pages):
+                    rows.append({"path": str(path), "page": i + 1,
+                                 **probe_page(page, min_chars=min_chars, image_coverage=image_coverage)})
+        except Exception as e:
+            print(f"⚠️ Could not probe {path}: {e}")
+            rows.append({"path": str(path), "page": None, "chars": None, "image_coverage": None,
+                         "mode": "error"})
+
+    df = pd.DataFrame(rows, columns=["path", "page", "chars", "image_coverage", "mode"])
+    if not df.empty:
+        pages = df["mode"].value_counts().to_dict()
+        files_needing_ocr = df.loc[df["mode"].isin(["ocr", "hybrid"]), "path"].nunique()
+        print(f"🔬 Pre-scan: {df['path'].nunique()} files, {len(df)} pages {pages}; "
+              f"{files_needing_ocr} files need OCR")
+    return df
+
+
+def release_page(page, images=None):
+    """
+    Drop a pdfplumber page's cached layout objects (chars, words, textmap...).
+    images: optional Document render cache ((page index, resolution) → image);
+            the page's renders are dropped from it too.
+    """
+    if images:
+        i = page.page_number - 1
+        for key in [k for k in images if k[0] == i]:
+            del images[key]
+    close = getattr(page, "close", None)
+    if close is not None:
+        close()
+    else:
+        page.flush_cache()
+
+
+def ocr_data_to_lines(df: pd.DataFrame):
+    """
+    Text lines of a tesseract image_to_data frame, in reading order.
+    Returns (lines, block_nums) with the tesseract block of each line.
+    """
+    words = df[df["conf"] != -1].dropna(subset=["text"])
+    words = words[words["text"].astype(str).str.strip() != ""]
+    lines, blocks = [], []
+    for (block, _, _), g in words.groupby(["block_num", "par_num", "line_num"], sort=False):
+        lines.append(" ".join(g["text"].astype(str)))
+        blocks.append(block)
+    return lines, blocks
+
+
+class Document:
+    """
+    PDF whose pages are extracted lazily, on first access.
+
+    Page text comes from the native text layer; with ocr=True, pages without one
+    are rasterized and OCR'd (through ocr_cache when given), up to ocr_workers
+    pages at a time. Page lines, words with bboxes and images asked for through
+    page_image are kept, so each is computed at most once per Document; renders
+    made only for OCR are dropped once OCR'd.
+    With an ExtractionCache, the lines of the first `max_pages` pages are cached
+    per budget (or for the whole document).
+
+    adaptive_ocr=True OCRs textless pages at low_resolution first and re-renders
+    at `resolution` only the text blocks whose mean word confidence is below
+    min_conf (the whole page when most of its words are). ocr_report counts
+    OCR'd / escalated pages and escalated blocks.
+
+    Each page is first classified by probe_page (native / ocr / hybrid), so
+    pages without a text layer skip extract_text, and with ocr=False they
+    come back empty (page_modes tells which ones were skipped).
+    """
+
+    def __init__(self, path, cache=None, ocr=False, ocr_cache=None, ocr_workers=1, resolution=300,
+                 adaptive_ocr=False, low_resolution=150, min_conf=60):
+        self.path = Path(path)
+        self.cache = cache
+        self.ocr = ocr
+        self.ocr_cache = ocr_cache
+        self.ocr_workers = ocr_workers
+        self.resolution = resolution
+        self.adaptive_ocr = adaptive_ocr
+        self.low_resolution = low_resolution
+        self.min_conf = min_conf
+        self.ocr_report = Counter()
+        self._report_lock = threading.Lock()
+        self._pdf = None
+        self._pages = {}      # page index → list of lines
+        self._words = {}      # page index → list of word dicts
+        self._images = {}     # (page index, resolution) → PIL image
+        self._lines = {}      # max_pages → TextLines
+        self.ocr_failed = []  # pages whose OCR raised
+        self.page_modes = {}  # page index → probe_page mode
+
+    def _open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.path)
+        return self._pdf
+
+    @property
+    def n_pages(self):
+        return len(self._open().pages)
+
+    def page_image(self, i, resolution=None):
+        """Page i rasterized as a PIL image (kept until the Document closes or iter_pages passes page i)."""
+        resolution = resolution or self.resolution
+        if (i, resolution) not in self._images:
+            page = self._open().pages[i]
+            self._images[(i, resolution)] = page.to_image(resolution=resolution).original
+        return self._images[(i, resolution)]
+
+    def words(self, i):
+        """Words of page i with their bboxes (pdfplumber extract_words dicts)."""
+        if i not in self._words:
+            page = self._open().pages[i]
+            self._words[i] = page.extract_words()
+            release_page(page)
+        return self._words[i]
+
+    def _ocr_text(self, image):
+        if self.ocr_cache is not None:
+            return self.ocr_cache.image_to_string(image)
+        return pytesseract.image_to_string(image)
+
+    def _ocr_data(self, image):
+        if self.ocr_cache is not None:
+            return self.ocr_cache.image_to_data(image)
+        return pytesseract.image_to_data(image, output_type=pytesseract.Output.DATAFRAME)
+
+    def _count(self, **counts):
+        with self._report_lock:
+            self.ocr_report.update(counts)
+
+    def _ocr_page_adaptive(self, page):
+        """OCR a pdfplumber page at low DPI, re-rendering low-confidence blocks at full DPI."""
+        low, high = self.low_resolution, self.resolution
+        df = self._ocr_data(page.to_image(resolution=low).original)
+        lines, blocks = ocr_data_to_lines(df)
+        self._count(pages_ocr=1)
+
+        words = df[(df["conf"] != -1) & df["text"].notna()]
+        if words.empty:
+            return "\n".join(lines)
+        block_conf = words.groupby("block_num")["conf"].mean()
+        weak = block_conf[block_conf < self.min_conf].index
+        if len(weak) == 0:
+            return "\n".join(lines)
+
+        # most of the page is weak → one full-page render instead of many crops
+        if words["block_num"].isin(weak).mean() > 0.5:
+            self._count(pages_escalated=1)
+            lines, _ = ocr_data_to_lines(self._ocr_data(page.to_image(resolution=high).original))
+            return "\n".join(lines)
+
+        self._count(pages_escalated=1, blocks_escalated=len(weak))
+        px_to_pt = 72.0 / low
+        x_off, y_off = page.bbox[0], page.bbox[1]
+        replaced = {}
+        for block in weak:
+            bw = words[words["block_num"] == block]
+            pad = 4  # points
+            bbox = (
+                max(page.bbox[0], x_off + bw["left"].min() * px_to_pt - pad),
+                max(page.bbox[1], y_off + bw["top"].min() * px_to_pt - pad),
+                min(page.bbox[2], x_off + (bw["left"] + bw["width"]).max() * px_to_pt + pad),
+                min(page.bbox[3], y_off + (bw["top"] + bw["height"]).max() * px_to_pt + pad),
+            )
+            crop = page.crop(bbox).to_image(resolution=high).original
+            replaced[block], _ = ocr_data_to_lines(self._ocr_data(crop))
+
+        out = []
+        for line, block in zip(lines, blocks):
+            if block in replaced:
+                out.extend(replaced.pop(block))  # once, where the block started
+            elif block not in weak:
+                out.append(line)
+        return "\n".join(out)
+
+    def _ocr_page(self, page, i):
+        if self.adaptive_ocr:
+            return self._ocr_page_adaptive(page)
+        self._count(pages_ocr=1)
+        # reuse a render a caller asked page_image for, but don't keep one made just for OCR
+        image = self._images.get((i, self.resolution))
+        if image is None:
+            image = page.to_image(resolution=self.resolution).original
+        return self._ocr_text(image)
+
+    def _ocr_page_threaded(self, i):
+        """Rasterize and OCR page i on a handle of its own (pdfplumber handles aren't thread-safe)."""
+        try:
+            with pdfplumber.open(self.path) as pdf:
+                return self._ocr_page(pdf.pages[i], i)
+        except Exception as e:
+            print(f"⚠️ OCR failed on page {i + 1} of {self.path}: {e}")
+            self.ocr_failed.append(i)
+            return None
+
+    def _read_pages(self, indexes):
+        """Fill self._pages for the given page indexes."""
+        todo = [i for i in indexes if i not in self._pages]
+        ocr_pages = []
+        for i in todo:
+            self._pages[i] = self._native_lines(i)
+            if self._needs_ocr(i, self._pages[i]):
+                ocr_pages.append(i)
+
+        if not ocr_pages:
+            return
+
+        n_workers = max(1, min(self.ocr_workers or 1, len(ocr_pages)))
+        if n_workers > 1:
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                results = list(executor.map(self._ocr_page_threaded, ocr_pages))
+        else:
+            results = []
+            for i in ocr_pages:
+                try:
+                    results.append(self._ocr_page(self._open().pages[i], i))
+                except Exception as e:
+                    print(f"⚠️ OCR failed on page {i + 1} of {self.path}: {e}")
+                    self.ocr_failed.append(i)
+                    results.append(None)
+
+        for i, text in zip(ocr_pages, results):
+            self._pages[i] = self._merge_ocr(i, self._pages[i], text)
+
+    def _native_lines(self, i):
+        """Probe page i, take its native text (if any) and release its layout caches."""
+        page = self._open().pages[i]
+        mode = probe_page(page)["mode"]
+        self.page_modes[i] = mode
+        self._count(**{f"probed_{mode}": 1})  # probe decisions; pages actually OCR'd are pages_ocr
+
+        text = page.extract_text() if mode != "ocr" else ""
+        release_page(page)
+        return text.split("\n") if text else []
+
+    def _needs_ocr(self, i, lines):
+        return self.ocr and (self.page_modes[i] != "native" or not lines)
+
+    def _merge_ocr(self, i, lines, text):
+        if not text:
+            return lines
+        if self.page_modes[i] == "hybrid" and lines:
+            # native lines first, then what only OCR found
+            seen = {l.strip() for l in lines}
+            return lines + [l for l in text.split("\n") if l.strip() not in seen]
+        return text.split("\n")
+
+    def iter_pages(self, max_pages=None):
+        """
+        Yield (page index, lines) one page at a time, releasing each page's
+        pdfplumber caches as soon as its text is taken and keeping nothing,
+        so memory stays flat however long the document is. OCR (with ocr=True)
+        runs page by page here.
+        """
+        n = self.n_pages if max_pages is None else min(max_pages, self.n_pages)
+        for i in range(n):
+            if i in self._pages:
+                yield i, self._pages[i]
+                continue
+
+            lines = self._native_lines(i)
+            if self._needs_ocr(i, lines):
+                try:
+                    text = self._ocr_page(self._open().pages[i], i)
+                    lines = self._merge_ocr(i, lines, text)
+                except Exception as e:
+                    print(f"⚠️ OCR failed on page {i + 1} of {self.path}: {e}")
+                    self.ocr_failed.append(i)
+            if self._images:
+                release_page(self._open().pages[i], self._images)
+            yield i, lines
+
+    def page_lines(self, i):
+        """Text lines of page i (0-based)."""
+        self._read_pages([i])
+        return self._pages[i]
+
+    def pages(self, max_pages=None):
+        """List of per-page line lists for the first max_pages pages (all if None)."""
+        variant = "ocr" if self.ocr else "native"
+        if self.ocr and self.adaptive_ocr:
+            variant = f"ocr:adaptive{self.low_resolution}-{self.resolution}-{self.min_conf}"
+        if max_pages is not None:
+            variant = f"{variant}:first{max_pages}"
+        key = self.cache.key(self.path, variant) if self.cache is not None else None
+        if key is not None:
+            pages = self.cache.get_pages(key)
+            if pages is not None:
+                return pages  # a hit doesn't even open the PDF
+
+        n = self.n_pages if max_pages is None else min(max_pages, self.n_pages)
+        self._read_pages(range(n))
+        pages = [self._pages[i] for i in range(n)]
+
+        # don't cache a document whose OCR failed, so it gets retried next run
+        if key is not None and not self.ocr_failed:
+            self.cache.set_pages(key, pages)
+        return pages
+
+    def lines(self, max_pages=None):
+        """Text lines of the first max_pages pages, concatenated, as a TextLines."""
+        if max_pages not in self._lines:
+            lines = TextLines()
+            for page in self.pages(max_pages):
+                lines.extend(page)
+            self._lines[max_pages] = lines
+        return self._lines[max_pages]
+
+    def close(self):
+        self._images.clear()  # rendered bitmaps are the biggest thing a Document holds
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
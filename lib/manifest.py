@@ -0,0 +1,111 @@
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from lib.cache_utils import DEFAULT_CACHE_DIR, file_sha256
+
+
+class IngestManifest:
+    """
+    SQLite manifest of the files already run through the pipeline.
+
+    One row per path with its size, mtime, content hash, detected doc_type,
+    status ("ok" / "error") and number of records produced. Files whose size
+    and mtime (or, failing that, content hash) are unchanged since a successful
+    run are skipped by run_extraction_pipeline.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_DIR / "manifest.sqlite"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                content_hash TEXT,
+                doc_type TEXT,
+                status TEXT,
+                row_count INTEGER,
+                error TEXT,
+                processed_at TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _key(path):
+        return str(Path(path).resolve())
+
+    def lookup(self, path):
+        """Manifest row for path as a dict, or None."""
+        cur = self.conn.execute("SELECT * FROM processed_files WHERE path = ?", (self._key(path),))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def needs_processing(self, path):
+        """
+        Return (needs_processing, content_hash).
+        The hash is only computed when size/mtime don't match the manifest, so
+        a run over an unchanged archive just stats the files.
+        """
+        st = os.stat(path)
+        row = self.lookup(path)
+
+        if row and row["status"] == "ok" and row["size"] == st.st_size and row["mtime"] == st.st_mtime:
+            return False, row["content_hash"]
+
+        content_hash = file_sha256(path)
+        if row and row["status"] == "ok" and row["content_hash"] == content_hash:
+            # touched but not modified → refresh stat info and skip
+            self.conn.execute(
+                "UPDATE processed_files SET size = ?, mtime = ? WHERE path = ?",
+                (st.st_size, st.st_mtime, self._key(path)),
+            )
+            self.conn.commit()
+            return False, content_hash
+
+        return True, content_hash
+
+    def record(self, path, content_hash, doc_type, status, row_count, error=None):
+        st = os.stat(path)
+        self.conn.execute(
+            """
+            INSERT INTO processed_files
+                (path, size, mtime, content_hash, doc_type, status, row_count, error, processed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size,
+                mtime = excluded.mtime,
+                content_hash = excluded.content_hash,
+                doc_type = excluded.doc_type,
+                status = excluded.status,
+                row_count = excluded.row_count,
+                error = excluded.error,
+                processed_at = excluded.processed_at
+            """,
+            (
+                self._key(path), st.st_size, st.st_mtime, content_hash, doc_type,
+                status, row_count, error, datetime.now().isoformat(timespec="seconds"),
+            ),
+        )
+        self.conn.commit()
+
+    def forget(self, path):
+        """Drop a path so it's reprocessed on the next run."""
+        self.conn.execute("DELETE FROM processed_files WHERE path = ?", (self._key(path),))
+        self.conn.commit()
+
+    def to_dataframe(self):
+        return pd.read_sql_query("SELECT * FROM processed_files ORDER BY path", self.conn)
+
+    def close(self):
+        self.conn.close()
@@ -1,5 +1,13 @@
 from lib.ocr_utils import *
 from lib.parse_utils import *
+import csv
+import io
+import tempfile
+
+try:
+    import tesserocr  # optional in-process tesseract binding (one engine for many images)
+except ImportError:
+    tesserocr = None
 
 
 def extract_table_section(text_list):
@@ -14,15 +22,141 @@ def extract_table_section(text_list):
     return text_list[start_idx:end_idx] if (start_idx and end_idx) else []
 
 
-def read_bbox_and_words(path: Path):
-    bbox_and_words_list = []
-    path = Path(path)
-    image = Image.open(path).convert("RGB")
-    ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DATAFRAME)
+# Options of preprocess_image used when read_bbox_and_words gets preprocess=True.
+DEFAULT_OCR_PREPROCESS = {
+    "grayscale": True,
+    "target_dpi": 300,
+    "max_side": 2500,
+    "binarize": True,
+    "deskew": True,
+    "crop_border": True,
+}
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu's threshold of a uint8 grayscale array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m0 = np.cumsum(hist * levels)
+    mean_total = m0[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_total * w0 / total - m0) ** 2 / (w0 * w1)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def _estimate_skew(binary: np.ndarray, max_angle=5.0, step=0.5) -> float:
+    """
+    Skew angle (degrees) of a binarized page: the rotation that makes the
+    row profile of dark pixels sharpest (text lines horizontal).
+    """
+    ink = Image.fromarray(((binary == 0) * 255).astype(np.uint8))
+    # a small copy is plenty to find the angle
+    ink.thumbnail((800, 800))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rows = np.asarray(ink.rotate(angle, resample=Image.NEAREST), dtype=np.float64).sum(axis=1)
+        score = float(np.sum(np.diff(rows) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_image(path, grayscale=True, target_dpi=300, max_side=None, binarize=False,
+                     deskew=False, crop_border=False, border_margin=10):
+    """
+    Prepare an image for tesseract. Returns (image, transform) where transform
+    holds what's needed to map OCR bboxes back to the original image:
+    x_original = x / scale + offset_x (same for y).
+
+    grayscale:   decode straight to 8-bit grayscale ("L").
+    target_dpi:  downscale images scanned above this DPI (when the file has DPI info).
+    max_side:    downscale so the longest side is at most this many pixels.
+                 JPEGs are then decoded in draft mode (reduced-size DCT), which
+                 skips most of the decoding work for large photos.
+    binarize:    Otsu threshold to pure black/white.
+    deskew:      rotate small skews (±5°) away; bboxes are not rotated back,
+                 which is within a few pixels for such angles.
+    crop_border: crop to the ink bounding box (plus border_margin pixels).
+    """
+    image = Image.open(path)
+    orig_w, orig_h = image.size
+
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if target_dpi and dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = min(scale, target_dpi / float(dpi[0]))
+    if max_side and max(orig_w, orig_h) > max_side:
+        scale = min(scale, max_side / float(max(orig_w, orig_h)))
+
+    mode = "L" if grayscale else "RGB"
+    if scale < 1.0 and image.format == "JPEG":
+        image.draft(mode, (int(orig_w * scale), int(orig_h * scale)))
+
+    image = image.convert(mode)
+    if scale < 1.0:
+        size = (max(1, round(orig_w * scale)), max(1, round(orig_h * scale)))
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+    scale_x = image.size[0] / float(orig_w)
+    scale_y = image.size[1] / float(orig_h)
+
+    if binarize or deskew or crop_border:
+        gray = np.asarray(image if image.mode == "L" else image.convert("L"))
+        binary = np.where(gray > _otsu_threshold(gray), 255, 0).astype(np.uint8)
+        if binarize:
+            image = Image.fromarray(binary)
+
+        if deskew:
+            angle = _estimate_skew(binary)
+            if angle:
+                image = image.rotate(angle, resample=Image.BICUBIC, fillcolor=255 if image.mode == "L" else (255, 255, 255))
+                binary = np.asarray(Image.fromarray(binary).rotate(angle, fillcolor=255))
+
+    offset_x = offset_y = 0
+    if crop_border:
+        box = ImageOps.invert(Image.fromarray(binary)).getbbox()
+        if box:
+            left = max(0, box[0] - border_margin)
+            top = max(0, box[1] - border_margin)
+            right = min(image.size[0], box[2] + border_margin)
+            bottom = min(image.size[1], box[3] + border_margin)
+            image = image.crop((left, top, right, bottom))
+            offset_x, offset_y = left / scale_x, top / scale_y
 
+    transform = {"scale_x": scale_x, "scale_y": scale_y, "offset_x": offset_x, "offset_y": offset_y}
+    return image, transform
+
+
+def _restore_bboxes(ocr_data: pd.DataFrame, transform) -> pd.DataFrame:
+    """Map tesseract left/top/width/height from the preprocessed image back to the original."""
+    ocr_data = ocr_data.copy()
+    for col, scale, offset in (("left", "scale_x", "offset_x"), ("top", "scale_y", "offset_y")):
+        ocr_data[col] = (ocr_data[col] / transform[scale] + transform[offset]).round().astype(int)
+    ocr_data["width"] = (ocr_data["width"] / transform["scale_x"]).round().astype(int)
+    ocr_data["height"] = (ocr_data["height"] / transform["scale_y"]).round().astype(int)
+    return ocr_data
+
+
+def _ocr_data_key(ocr_cache, path, preprocess):
+    if ocr_cache is None:
+        return None
+    config_tag = f"preprocess={sorted(preprocess.items())}" if preprocess else ""
+    # cached OCR is keyed by the raw file bytes, so a hit doesn't even decode the image
+    return ocr_cache.key(ocr_cache.file_digest(path), "data", config=config_tag)
+
+
+def _words_frame(ocr_data: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """tesseract image_to_data frame → filename / bbox / word columns."""
     if ocr_data.empty:
         print(f"❌ No OCR text extracted from {path.name}")
-        return pd.DataFrame(columns=['filename', 'x0', 'y0', 'x2', 'y2', 'line'])
+        return pd.DataFrame(columns=['filename', 'x0', 'y0', 'x2', 'y2', 'line',
+                                     'block_num', 'par_num', 'line_num', 'conf'])
 
     # Rename columns for consistency
     ocr_data = ocr_data.rename(columns={"left": "x0", "top": "y0", "width": "w", "height": "h"})
@@ -31,7 +165,186 @@ def read_bbox_and_words(path: Path):
     ocr_data["filename"] = path.stem
     ocr_data["line"] = ocr_data["text"]
 
-    return ocr_data[["filename", "x0", "y0", "x2", "y2", "line"]]
+    return ocr_data[["filename", "x0", "y0", "x2", "y2", "line", "block_num", "par_num", "line_num", "conf"]]
+
+
+def _ocr_input(path: Path, preprocess=None):
+    """
+    (image, transform) tesseract gets for path: the RGB image, or the preprocessed
+    one and its preprocess_image transform. The single and batch paths both OCR
+    this, so a cached result doesn't depend on which one filled it.
+    """
+    if preprocess:
+        return preprocess_image(path, **preprocess)
+    return Image.open(path).convert("RGB"), None
+
+
+def _image_to_data(path: Path, preprocess=None):
+    """One tesseract image_to_data run on a single image (bboxes in original coordinates)."""
+    image, transform = _ocr_input(path, preprocess)
+    ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DATAFRAME)
+    return _restore_bboxes(ocr_data, transform) if transform is not None else ocr_data
+
+
+def read_bbox_and_words(path: Path, ocr_cache=None, preprocess=None):
+    """
+    Word-level OCR of an image (tesseract image_to_data).
+
+    preprocess: None / False hands tesseract the full-resolution RGB image (as before);
+                True uses DEFAULT_OCR_PREPROCESS, or pass a dict of preprocess_image
+                options. Bboxes are always returned in original image coordinates.
+    """
+    path = Path(path)
+
+    if preprocess is True:
+        preprocess = DEFAULT_OCR_PREPROCESS
+
+    key = _ocr_data_key(ocr_cache, path, preprocess)
+    ocr_data = ocr_cache.get_data(key) if key is not None else None
+
+    if ocr_data is None:
+        ocr_data = _image_to_data(path, preprocess)
+        if key is not None:
+            ocr_cache.set_data(key, ocr_data)
+
+    return _words_frame(ocr_data, path)
+
+
+# ---------------------------
+# BATCH OCR
+# ---------------------------
+
+def _split_tsv_pages(tsv: str):
+    """
+    Split a multi-image tesseract TSV by page_num into one DataFrame per image,
+    each parsed on its own exactly as pytesseract parses a single-image TSV.
+    """
+    rows = tsv.strip("\n").split("\n")
+    header, body = rows[0], rows[1:]
+    pages = {}
+    for row in body:
+        cells = row.split("\t", 2)
+        if len(cells) < 2:
+            continue
+        pages.setdefault(int(cells[1]), []).append(row)
+
+    frames = {}
+    for page_num, page_rows in pages.items():
+        df = pd.read_csv(io.StringIO("\n".join([header] + page_rows)), quoting=csv.QUOTE_NONE, sep="\t")
+        df["page_num"] = 1  # as if the image had been OCR'd on its own
+        frames[page_num] = df
+    return frames
+
+
+def _batch_image_to_data_tesseract(image_files):
+    """One tesseract process for many images, via its list-file input (one image path per line)."""
+    with tempfile.TemporaryDirectory(prefix="ocr_batch_") as tmp:
+        list_file = Path(tmp) / "images.txt"
+        list_file.write_text("\n".join(str(Path(f).resolve()) for f in image_files) + "\n", encoding="utf-8")
+        tsv = pytesseract.image_to_data(str(list_file), output_type=pytesseract.Output.BYTES).decode("utf-8")
+    frames = _split_tsv_pages(tsv)
+    return [frames.get(k + 1, pd.DataFrame()) for k in range(len(image_files))]
+
+
+_TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+def _batch_image_to_data_tesserocr(images):
+    """One in-process tesserocr engine for many PIL images."""
+    frames = []
+    with tesserocr.PyTessBaseAPI() as api:
+        for image in images:
+            api.SetImage(image)
+            api.Recognize()
+            tsv = _TSV_HEADER + "\n" + (api.GetTSVText(0) or "")
+            frames.append(_split_tsv_pages(tsv).get(1, pd.DataFrame()))
+    return frames
+
+
+def _ocr_batch(paths, preprocess, engine):
+    """image_to_data frames (original coordinates) for one batch of image paths."""
+    transforms = [None] * len(paths)
+    if engine == "tesserocr":
+        images = []
+        for n, path in enumerate(paths):
+            image, transforms[n] = _ocr_input(path, preprocess)
+            images.append(image)
+        frames = _batch_image_to_data_tesserocr(images)
+    else:
+        # not the files on disk: palette / RGBA / CMYK images would OCR differently
+        with tempfile.TemporaryDirectory(prefix="ocr_prep_") as tmp:
+            files = []
+            for n, path in enumerate(paths):
+                image, transforms[n] = _ocr_input(path, preprocess)
+                f = Path(tmp) / f"{n}.png"  # lossless, same as pytesseract's temp files
+                image.save(f)
+                files.append(f)
+            frames = _batch_image_to_data_tesseract(files)
+
+    return [
+        _restore_bboxes(df, t) if t is not None and not df.empty else df
+        for df, t in zip(frames, transforms)
+    ]
+
+
+def read_bbox_and_words_batch(paths, ocr_cache=None, preprocess=None, batch_size=64, engine="auto"):
+    """
+    read_bbox_and_words for many images, without one tesseract start-up per image.
+
+    engine: "tesserocr" keeps one in-process engine (needs the tesserocr package),
+            "tesseract" runs one tesseract process per batch of `batch_size`
+            images (list-file input), "auto" picks tesserocr when installed.
+    Returns one DataFrame per path, in input order (None for images that failed
+    even on their own). Cached images are not re-OCR'd, and new results are
+    written to ocr_cache. A batch that fails is redone one image at a time.
+    """
+    paths = [Path(p) for p in paths]
+    if preprocess is True:
+        preprocess = DEFAULT_OCR_PREPROCESS
+    if engine == "auto":
+        engine = "tesserocr" if tesserocr is not None else "tesseract"
+
+    keys = [_ocr_data_key(ocr_cache, p, preprocess) for p in paths]
+    results = [ocr_cache.get_data(k) if k is not None else None for k in keys]
+    todo = [i for i, r in enumerate(results) if r is None]
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        try:
+            frames = _ocr_batch([paths[i] for i in batch], preprocess, engine)
+        except Exception as e:
+            # one bad image (or a missing engine) shouldn't sink the whole batch → image by image
+            print(f"⚠️ OCR batch failed ({e}); falling back to one image at a time")
+            frames = []
+            for i in batch:
+                try:
+                    frames.append(_image_to_data(paths[i], preprocess))
+                except Exception as e_img:
+                    print(f"❌ OCR failed for {paths[i].name}: {e_img}")
+                    frames.append(None)  # left uncached: process_file retries and logs it
+
+        for i, ocr_data in zip(batch, frames):
+            if ocr_data is None:
+                continue
+            if keys[i] is not None:
+                ocr_cache.set_data(keys[i], ocr_data)
+            results[i] = ocr_data
+
+        print(f"🔠 OCR batch: {min(start + batch_size, len(todo))}/{len(todo)} images")
+
+    return [None if ocr_data is None else _words_frame(ocr_data, p) for ocr_data, p in zip(results, paths)]
+
+
+def warm_ocr_cache(paths, ocr_cache, preprocess=None, batch_size=64, engine="auto"):
+    """
+    Batch-OCR the images among paths into ocr_cache, so the per-file pipeline
+    only reads cached results for them.
+    """
+    images = [p for p in paths if Path(p).suffix.lower() in (".jpg", ".jpeg", ".png")]
+    if images:
+        read_bbox_and_words_batch(images, ocr_cache=ocr_cache, preprocess=preprocess,
+                                  batch_size=batch_size, engine=engine)
+    return len(images)
 
 
 def visualize_bboxes(image_path, df: pd.DataFrame,
@@ -86,44 +399,59 @@ def visualize_bboxes(image_path, df: pd.DataFrame,
 
 
 
-def group_ocr_words(df, y_tolerance=10):
+def group_ocr_words(df, y_tolerance=10, use_tesseract_lines=False):
     """
     Groups nearby words (same y range) into full text lines.
     This merges OCR word-level detections into coherent lines.
+
+    Vectorized: a new line starts wherever the y0 gap to the previous word
+    (in y0/x0 order) exceeds y_tolerance. The frame may hold the words of
+    several images (different `filename`s); each image is grouped on its own.
+    use_tesseract_lines=True groups on tesseract's block/par/line numbers
+    instead, when those columns are present, and joins each line's words in
+    x0 order.
     """
 
     if "text" in df.columns:
         df = df.rename(columns={"text": "line"})
     df = df.dropna(subset=["line"])
     df = df[df["line"].str.strip() != ""].copy()
-    df = df.sort_values(["y0", "x0"]).reset_index(drop=True)
-
-    # Group words that are on the same text line (close y0)
-    groups, current, last_y = [], [], None
-    for _, row in df.iterrows():
-        if last_y is None or abs(row["y0"] - last_y) <= y_tolerance:
-            current.append(row)
-        else:
-            groups.append(current)
-            current = [row]
-        last_y = row["y0"]
-    if current:
-        groups.append(current)
+
+    multi_file = df["filename"].nunique() > 1
+    if multi_file:
+        # keep files in order of first appearance, then y0/x0 inside each file
+        df["_file"] = pd.factorize(df["filename"])[0]
+        df = df.sort_values(["_file", "y0", "x0"], kind="stable").reset_index(drop=True)
+    else:
+        df = df.sort_values(["y0", "x0"]).reset_index(drop=True)
+
+    tesseract_cols = ["block_num", "par_num", "line_num"]
+    if use_tesseract_lines and all(c in df.columns for c in tesseract_cols):
+        keys = (["_file"] if multi_file else []) + tesseract_cols
+        # lines in order of their first word, words left to right inside each line
+        # (on a skewed line the y0/x0 order would put a higher amount before its label)
+        df["_line"] = df.groupby(keys, sort=False).ngroup()
+        df = df.sort_values(["_line", "x0"], kind="stable")
+        line_id = df["_line"]
+    else:
+        # Group words that are on the same text line (close y0)
+        new_line = df["y0"].diff().abs() > y_tolerance
+        if multi_file:
+            new_line |= df["_file"].diff().fillna(0) != 0
+        line_id = new_line.cumsum()
 
     # Merge groups into single lines
-    merged = []
-    for g in groups:
-        line_text = " ".join(w["line"] for _, w in pd.DataFrame(g).iterrows())
-        merged.append({
-            "filename": g[0]["filename"],
-            "x0": min(w["x0"] for w in g),
-            "y0": min(w["y0"] for w in g),
-            "x2": max(w["x2"] for w in g),
-            "y2": max(w["y2"] for w in g),
-            "line": line_text.strip()
-        })
-
-    return pd.DataFrame(merged)
+    merged = df.groupby(line_id, sort=False).agg(
+        filename=("filename", "first"),
+        x0=("x0", "min"),
+        y0=("y0", "min"),
+        x2=("x2", "max"),
+        y2=("y2", "max"),
+        line=("line", " ".join),
+    )
+    merged["line"] = merged["line"].str.strip()
+
+    return merged.reset_index(drop=True)
 
 
 def read_entities(path: Path):
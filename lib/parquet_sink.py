@@ -0,0 +1,221 @@
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from lib.schemas import RECORD_SCHEMAS, SCHEMA_KINDS, Category, _is_null, _typed_column
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+DEFAULT_PARQUET_DIR = Path("parquet")
+
+
+def _infer_arrow_type(values):
+    """Narrowest arrow type holding every non-null value; strings when mixed."""
+    kinds = set()
+    for v in values:
+        if _is_null(v):
+            continue
+        if isinstance(v, bool):
+            kinds.add("bool")
+        elif isinstance(v, int):
+            kinds.add("int")
+        elif isinstance(v, float):
+            kinds.add("float")
+        elif isinstance(v, datetime):
+            kinds.add("timestamp")
+        elif isinstance(v, date):
+            kinds.add("date")
+        else:
+            kinds.add("string")
+
+    if kinds == {"bool"}:
+        return pa.bool_()
+    if kinds == {"int"}:
+        return pa.int64()
+    if kinds and kinds <= {"int", "float"}:
+        return pa.float64()
+    if kinds == {"timestamp"}:
+        return pa.timestamp("us")
+    if kinds == {"date"}:
+        return pa.date32()
+    return pa.string()
+
+
+def _declared_arrow_schema(doc_type, partition_cols):
+    """Arrow schema from lib.schemas' record schema of doc_type (None if it has none)."""
+    schema = RECORD_SCHEMAS.get(doc_type)
+    if schema is None:
+        return None
+    types = {Category: pa.string(), str: pa.string(), float: pa.float64(), int: pa.int64(), date: pa.date32()}
+    return pa.schema([
+        pa.field(f, pa.string() if f in partition_cols else types[kind])
+        for f, kind in SCHEMA_KINDS[schema].items() if f != "doc_type"
+    ])
+
+
+def _as_text(value):
+    # typed frames hold dates as midnight Timestamps → "2023-02-01", not "2023-02-01 00:00:00"
+    if isinstance(value, datetime) and value == datetime.combine(value.date(), datetime.min.time()):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)  # Path, mixed qty ("Lump Sum" / 12.0)...
+
+
+def _to_arrow(values, arrow_type):
+    values = [None if _is_null(v) else v for v in values]
+    if pa.types.is_string(arrow_type):
+        values = [None if v is None else _as_text(v) for v in values]
+    elif pa.types.is_date(arrow_type) and any(v is not None and not isinstance(v, date) for v in values):
+        parsed = pd.to_datetime(pd.Series(values, dtype=object).map(lambda v: v if v is None else str(v)),
+                                format="mixed", errors="coerce")
+        values = [None if pd.isna(v) else v.date() for v in parsed]
+    elif pa.types.is_floating(arrow_type):
+        values = [None if v is None else float(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+class ParquetSink:
+    """
+    Columnar staging output: records are split by doc_type and each doc type is
+    appended to its own Parquet dataset under root/doc_type=<type>/, with its
+    own schema and hive partitions (letting_date=<date>/ by default).
+
+    A doc type's schema is read back from files already there, else taken from
+    its record schema in lib.schemas, else fixed by the first batch written for
+    it: only the columns its records have, each with a single type (mixed
+    columns such as qty become strings). Later
+    batches are cast to it (declared fields through lib.schemas' conversions,
+    so "1,929,500.00" becomes 1929500.0); a value that still doesn't fit raises
+    ValueError instead of being written as null. Columns the schema doesn't
+    know are dropped with a warning. Every write() adds new files, so batches can be appended as they
+    come out of iter_extraction_records.
+    """
+
+    def __init__(self, root=DEFAULT_PARQUET_DIR, partition_cols=("letting_date",)):
+        if pa is None:
+            raise ImportError("ParquetSink needs pyarrow (pip install pyarrow)")
+        self.root = Path(root)
+        self.partition_cols = tuple(partition_cols)
+        self.run_id = uuid.uuid4().hex[:8]
+        self._schemas = {}
+        self._batches = 0
+
+    def _dataset_dir(self, doc_type):
+        return self.root / f"doc_type={doc_type}"
+
+    def schema(self, doc_type):
+        """Arrow schema of a doc type (partition columns included), or None if never written."""
+        if doc_type not in self._schemas:
+            files = sorted(self._dataset_dir(doc_type).rglob("*.parquet"))
+            if not files:
+                return None
+            schema = pq.read_schema(files[0])
+            for col in self.partition_cols:
+                if col not in schema.names and any(f"{col}=" in part for part in files[0].parts):
+                    schema = schema.append(pa.field(col, pa.string()))
+            self._schemas[doc_type] = schema
+        return self._schemas[doc_type]
+
+    @staticmethod
+    def _group_records(batch):
+        """doc_type → (column names, list of records)."""
+        groups = {}
+        if isinstance(batch, pd.DataFrame):
+            doc_types = batch["doc_type"].astype(object) if "doc_type" in batch else pd.Series(None, index=batch.index)
+            for doc_type, g in batch.groupby(doc_types.fillna("invoice"), sort=False):
+                # a wide frame holds every doc type's columns → keep the ones this type fills
+                cols = [c for c in g.columns if c != "doc_type" and g[c].notna().any()]
+                groups[doc_type] = (cols, g[cols].to_dict(orient="records"))
+            return groups
+
+        for record in batch:
+            doc_type = record.get("doc_type") or "invoice"  # invoice / receipt lines carry no doc_type
+            cols, records = groups.setdefault(doc_type, ([], []))
+            for c in record:
+                if c != "doc_type" and c not in cols:
+                    cols.append(c)
+            records.append(record)
+        return groups
+
+    def write(self, batch):
+        """
+        Append a batch (list of record dicts or a DataFrame) to the datasets.
+        Returns {doc_type: rows written}.
+        """
+        written = {}
+        for doc_type, (cols, records) in self._group_records(batch).items():
+            if not records:
+                continue
+
+            schema = self.schema(doc_type)
+            if schema is None:
+                schema = _declared_arrow_schema(doc_type, self.partition_cols)
+                if schema is not None:
+                    self._schemas[doc_type] = schema
+            if schema is None:
+                schema = pa.schema([
+                    # partition values end up as directory names → strings
+                    pa.field(c, pa.string() if c in self.partition_cols
+                             else _infer_arrow_type([r.get(c) for r in records]))
+                    for c in cols
+                ])
+                self._schemas[doc_type] = schema
+            else:
+                extra = [c for c in cols if c not in schema.names
+                         and any(not _is_null(r.get(c)) for r in records)]
+                if extra:
+                    print(f"⚠️ Parquet {doc_type}: dropping columns not in its schema: {extra}")
+
+            kinds = SCHEMA_KINDS.get(RECORD_SCHEMAS.get(doc_type), {})
+            arrays = []
+            for field in schema:
+                values = [r.get(field.name) for r in records]
+                if field.name in kinds:
+                    # untyped records still hold "1,929,500.00", "OCT 13 2023"... → declared types first
+                    typed = _typed_column(field.name, values, kinds[field.name]).tolist()
+                    lost = [v for v, t in zip(values, typed) if not _is_null(v) and _is_null(t)]
+                    if lost:
+                        raise ValueError(f"Parquet {doc_type}: {len(lost)} value(s) of {field.name} "
+                                         f"don't fit {field.type} (e.g. {lost[0]!r})")
+                    values = typed
+                try:
+                    arrays.append(_to_arrow(values, field.type))
+                except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError) as e:
+                    raise ValueError(f"Parquet {doc_type}: column {field.name} doesn't fit {field.type}: {e}") from e
+            table = pa.Table.from_arrays(arrays, schema=schema)
+
+            partition_cols = [c for c in self.partition_cols if c in schema.names]
+            pq.write_to_dataset(
+                table,
+                root_path=str(self._dataset_dir(doc_type)),
+                partition_cols=partition_cols or None,
+                basename_template=f"part-{self.run_id}-{self._batches:05d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            written[doc_type] = table.num_rows
+
+        self._batches += 1
+        if written:
+            print(f"🧱 Parquet: wrote {written} to {self.root}")
+        return written
+
+    def read(self, doc_type, columns=None, filters=None):
+        """Read one doc type back (optionally only some columns / partitions) as a DataFrame."""
+        path = self._dataset_dir(doc_type)
+        if not path.exists():
+            return pd.DataFrame()
+        # explicit string partitions: inferred dictionaries can't hold the null (__HIVE_DEFAULT_PARTITION__) one
+        schema = self.schema(doc_type)
+        partitioning = pa.dataset.partitioning(
+            pa.schema([schema.field(c) for c in self.partition_cols if c in schema.names]), flavor="hive"
+        )
+        return pq.read_table(str(path), columns=columns, filters=filters, partitioning=partitioning).to_pandas()
@@ -13,9 +13,10 @@ from functools import reduce
 from datetime import datetime, date
 from PIL import Image, ImageOps, ImageFilter, ImageDraw
 import pytesseract
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
 from pathlib import PosixPath
 import pathlib
+from lib.document import TextLines, full_text_of, stripped_lines_of
 
 
 
@@ -169,110 +170,162 @@ def parse_invoice_line(line):
     }
 
 
+# extract_invoice_metadata patterns
+_SUPPLIER_TIN_RE = re.compile(r"(?<!G)TIN[:\s]+(\d+)", re.IGNORECASE)
+_CLIENT_TIN_RE = re.compile(r"TIN[:\s]+(\d+)", re.IGNORECASE)
+_INVOICE_NO_RE = re.compile(r"\b(?:INVOICE|RECEIPT|TAX\s*INVOICE)\s*#?\s*[:\-]?\s*([A-Z]?\d{3,})\b")
+_INVOICE_NO_FALLBACK_RE = re.compile(r"\b[RT]\d{6,}\b")
+_INVOICE_DATE_RE = re.compile(r"Invoice Date[:\s]+(.+)", re.IGNORECASE)
+_DUE_DATE_RE = re.compile(r"Due Date[:\s]+(.+)", re.IGNORECASE)
+_SUBTOTAL_RE = re.compile(r"Sub\s*Total|TOTAL", re.IGNORECASE)
+_TOTAL_WORD_RE = re.compile(r"\bTOTAL\b", re.IGNORECASE)
+_GST_RE = re.compile(r"GST", re.IGNORECASE)
+_AMOUNT_RE = re.compile(r"\d+[,.]?\d*")
+_GST_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+_DIGIT_RE = re.compile(r"\d")
+_TOTALS_HINT_RE = re.compile(r"TOTAL|GST", re.IGNORECASE)  # cheap gate for the totals / tax lines
+
+
+def _gst_values(line):
+    """(tax_amount, subtotal, tax_label) from a GST line, or None if it has < 2 numbers."""
+    # Normalize
+    u = line.replace("％", "%").replace("°", "%").replace("‰", "%")
+
+    # Extract all numeric values
+    numbers = _GST_NUMBER_RE.findall(u)
+    values = [parse_float(x) for x in numbers if parse_float(x) is not None]
+
+    # Skip invalid or single-value GST lines (like GST@6%)
+    if len(values) < 2:
+        return None
+
+    # Typical patterns: [2.55, 6.0, 42.45]  or  [0.22, 3.68, 6.0]
+    values_sorted = sorted(values)
+
+    # If one of the numbers is a "rate" (5–15 %), ignore it
+    rates = [v for v in values_sorted if 4.0 <= v <= 15.0]  # GST/VAT rates are usually 4–15 %
+    non_rates = [v for v in values_sorted if v not in rates]
+
+    if len(non_rates) >= 2:
+        # Usually smaller number = tax, larger = subtotal
+        non_rates_sorted = sorted(non_rates)
+        tax_amount = non_rates_sorted[0]
+        subtotal = non_rates_sorted[-1]
+    elif len(non_rates) == 1 and rates:
+        # one numeric + one rate → treat numeric as subtotal, tax = subtotal * rate/100
+        subtotal = non_rates[0]
+        tax_amount = round(subtotal * (rates[-1] / 100), 2)
+    else:
+        # fallback: smallest = tax, largest = subtotal
+        tax_amount = values_sorted[0]
+        subtotal = values_sorted[-1]
+
+    tax_label = f"GST {rates[-1]}%" if rates else "GST"
+
+    if tax_label:
+        m = re.search(r"(\d+(?:\.\d+)?)", str(tax_label))
+        if m:
+            tax_label = float(m.group(1))
+
+    return tax_amount, subtotal, tax_label
+
+
 def extract_invoice_metadata(text_list):
-    """Extract supplier, client, invoice details, and totals."""
+    """
+    Extract supplier, client, invoice details, and totals.
+
+    TINs, invoice number and dates keep their first match, so they're read in a
+    forward pass that stops once all of them are filled. "Bill to", totals and
+    GST keep their last match, so they're read in a backward pass that stops at
+    the first (i.e. last) hit for each.
+    """
     supplier_name = " ".join([s.strip() for s in text_list[:2] if s.strip()])
     invoice_number = invoice_date = due_date = None
     client_name = client_address = supplier_tin = client_tin = None
     subtotal = tax_label = tax_amount = total_amount = None
 
+    # ---- forward pass: first match wins ----
     for line in text_list:
-        u = line.strip().upper()
+        if supplier_tin and client_tin and invoice_number and invoice_date and due_date:
+            break
 
-        # --- Supplier TIN ---
-        if not supplier_tin:
-            m = re.search(r"(?<!G)TIN[:\s]+(\d+)", line, re.IGNORECASE)
-            if m:
-                supplier_tin = m.group(1)
+        # TINs and invoice numbers all need a digit
+        if _DIGIT_RE.search(line):
+            # --- Supplier TIN ---
+            if not supplier_tin:
+                m = _SUPPLIER_TIN_RE.search(line)
+                if m:
+                    supplier_tin = m.group(1)
 
-        # --- Invoice Number (now robust for GST ID No :001092886528) ---
-        if not invoice_number:
-            # common direct forms
-            m = re.search(r"\b(?:INVOICE|RECEIPT|TAX\s*INVOICE)\s*#?\s*[:\-]?\s*([A-Z]?\d{3,})\b", u)
-            if m:
-                invoice_number = m.group(1)
-            else:
-                # pattern like R0000183898 or T000011248
-                m2 = re.search(r"\b[RT]\d{6,}\b", u)
-                if m2:
-                    invoice_number = m2.group(0)
+            # --- Invoice Number (now robust for GST ID No :001092886528) ---
+            if not invoice_number:
+                u = line.strip().upper()
+                # common direct forms
+                m = _INVOICE_NO_RE.search(u)
+                if m:
+                    invoice_number = m.group(1)
+                else:
+                    # pattern like R0000183898 or T000011248
+                    m2 = _INVOICE_NO_FALLBACK_RE.search(u)
+                    if m2:
+                        invoice_number = m2.group(0)
+
+            if not client_tin:
+                m = _CLIENT_TIN_RE.search(line)
+                if m:
+                    client_tin = m.group(1)
 
         # --- Invoice & Due Dates ---
         if not invoice_date:
-            m = re.search(r"Invoice Date[:\s]+(.+)", line, re.IGNORECASE)
+            m = _INVOICE_DATE_RE.search(line)
             if m:
                 invoice_date = parse_date(m.group(1))
 
         if not due_date:
-            m = re.search(r"Due Date[:\s]+(.+)", line, re.IGNORECASE)
+            m = _DUE_DATE_RE.search(line)
             if m:
                 due_date = parse_date(m.group(1))
 
+    # ---- backward pass: last match wins ----
+    client_found = total_found = subtotal_found = tax_found = False
+    for i in range(len(text_list) - 1, -1, -1):
+        if client_found and total_found and subtotal_found and tax_found:
+            break
+        line = text_list[i]
+
         # --- Client Info ---
-        if "Bill to" in line:
-            idx = text_list.index(line)
+        if not client_found and "Bill to" in line:
+            client_found = True
+            idx = text_list.index(line)  # first occurrence of that line, as before
             client_name = text_list[idx + 2].strip() if len(text_list) > idx + 2 else None
             client_address = ", ".join(text_list[idx + 3 : idx + 6]).strip()
 
-        if not client_tin:
-            m = re.search(r"TIN[:\s]+(\d+)", line, re.IGNORECASE)
-            if m:
-                client_tin = m.group(1)
+        if not _TOTALS_HINT_RE.search(line):
+            continue
 
-    # --- Subtotal ---
-        if re.search(r"Sub\s*Total|TOTAL", line, re.IGNORECASE):
+        # --- GST / Tax (applied after Subtotal within a line, so checked first here) ---
+        if not (tax_found and subtotal_found) and _GST_RE.search(line) and not _TOTAL_WORD_RE.search(line):
+            gst = _gst_values(line)
+            if gst:
+                if not tax_found:
+                    tax_amount, _, tax_label = gst
+                    tax_found = True
+                if not subtotal_found:
+                    subtotal = gst[1]
+                    subtotal_found = True
+
+        # --- Subtotal ---
+        if not (total_found and subtotal_found) and _SUBTOTAL_RE.search(line):
             # Find all numbers in the line
-            numbers = re.findall(r"\d+[,.]?\d*", line)
+            numbers = _AMOUNT_RE.findall(line)
             if numbers:
                 # Take the last number found (usually the amount)
-                subtotal = parse_float(numbers[-1])
-                total_amount = parse_float(numbers[0])
-                
-            
-
-               
-        # --- GST / Tax ---
-        if re.search(r"GST", line, re.IGNORECASE) and not re.search(r"\bTOTAL\b", line, re.IGNORECASE):
-            # Normalize
-            u = line.replace("％", "%").replace("°", "%").replace("‰", "%")
-
-            # Extract all numeric values
-            numbers = re.findall(r"\d+(?:[.,]\d+)?", u)
-            values = [parse_float(x) for x in numbers if parse_float(x) is not None]
-
-            # Skip invalid or single-value GST lines (like GST@6%)
-            if len(values) >= 2:
-                # Typical patterns: [2.55, 6.0, 42.45]  or  [0.22, 3.68, 6.0]
-                values_sorted = sorted(values)
-
-                # If one of the numbers is a "rate" (5–15 %), ignore it
-                rates = [v for v in values_sorted if 4.0 <= v <= 15.0]  # GST/VAT rates are usually 4–15 %
-                non_rates = [v for v in values_sorted if v not in rates]
-
-                if len(non_rates) >= 2:
-                    # Usually smaller number = tax, larger = subtotal
-                    non_rates_sorted = sorted(non_rates)
-                    tax_amount = non_rates_sorted[0]
-                    subtotal = non_rates_sorted[-1]
-                elif len(non_rates) == 1 and rates:
-                    # one numeric + one rate → treat numeric as subtotal, tax = subtotal * rate/100
-                    subtotal = non_rates[0]
-                    tax_amount = round(subtotal * (rates[-1] / 100), 2)
-                else:
-                    # fallback: smallest = tax, largest = subtotal
-                    tax_amount = values_sorted[0]
-                    subtotal = values_sorted[-1]
-
-                tax_label = f"GST {rates[-1]}%" if rates else "GST"
-
-                if tax_label:
-                    m = re.search(r"(\d+(?:\.\d+)?)", str(tax_label))
-                    if m:
-                        tax_label = float(m.group(1))
-
-
-
-
+                if not subtotal_found:
+                    subtotal = parse_float(numbers[-1])
+                    subtotal_found = True
+                if not total_found:
+                    total_amount = parse_float(numbers[0])
+                    total_found = True
 
     try:
         if subtotal and tax_amount and tax_amount > subtotal:
@@ -315,176 +368,296 @@ def extract_table_section(text_list):
 # OCD / JPG HELPERS
 # ---------------------------
 
-def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, processed_date, file_path: str):
+# ---------- RECEIPT RULES (compiled once at import) ----------
+NOISE_WORDS = (
+    "TOTAL", "CASH", "CHANGE", "QTY(S)", "QTY", "ITEM(S)", "ITEM",
+    "SUMMARY", "SUBTOTAL", "INCL", "EXCL", "AMT(RM)", "TAX(RM)", "RM"
+)
+HEADER_WORDS = (
+    "INVOICE", "TAX INVOICE", "INVOICE#", "INVOICE #", "TOTAL INCL.", "TOTAL INCL",
+    "GST SUMMARY", "GST@", "GST S@", "GST ID", "GST NO", "GST ID NO", "GST ID:"
+)
 
+PRICE_PATTERNS = [
 
-    # ---------- CONFIG ----------
-    NOISE_WORDS = (
-        "TOTAL", "CASH", "CHANGE", "QTY(S)", "QTY", "ITEM(S)", "ITEM",
-        "SUMMARY", "SUBTOTAL", "INCL", "EXCL", "AMT(RM)", "TAX(RM)", "RM"
-    )
-    HEADER_WORDS = (
-        "INVOICE", "TAX INVOICE", "INVOICE#", "INVOICE #", "TOTAL INCL.", "TOTAL INCL",
-        "GST SUMMARY", "GST@", "GST S@", "GST ID", "GST NO", "GST ID NO", "GST ID:"
-    )
+# SKU qty X price total  → "9556268000210 3 X 15.00 45.00"
+re.compile(r"^(?P<sku>\d{5,})\s+(?P<qty>\d{1,3})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))"),    
 
-    def _is_noise(line: str) -> bool:
-        u = line.upper()
-        return any(w in u for w in NOISE_WORDS)
+# SKU X price total  → "9072363 X 29.90 29.90"
+re.compile(r"^(?P<sku>\d{5,})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))"),
 
-    def _is_header(line: str) -> bool:
-        u = line.upper().strip()
-        if any(w in u for w in HEADER_WORDS):
-            return True
-        if re.fullmatch(r"[-=]{4,}", u):
-            return True
-        return False
+# SKU price qty X total  → "9021937 3.90 1 X 3.90" / "9021937 3.90 1X 3.90"
+re.compile(r"^(?P<sku>\d{5,})\s+(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
 
-    def _looks_like_desc(line: str) -> bool:
-        return bool(re.search(r"[A-Za-z]", line)) and not _is_noise(line)
+# price qty X total       → "3.90 1 X 3.90"
+re.compile(r"^(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
 
-    def _norm_num(x):
-        if x is None:
-            return None
-        s = str(x).strip().replace(" ", "")
-        s = s.replace(",", ".")  # unify separators
+# qty X price total       → "1 X 29.90 29.90" or "1X 8.90 8.90"  (qty max 3 digits)
+re.compile(r"^(?P<qty>\d{1,3})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
 
-        try:
-            val = float(s)
-            # Heuristic: if looks too large to be realistic (like >10k) and has no decimal part
-            if val > 10000 and val.is_integer():
-                val = val / 100   # treat as cents
-            return val
-        except ValueError:
-            return None
+# price ... qty X total   → "8.98 6942131561408 1X 8.90"
+re.compile(r"^(?P<price>\d+(?:[.,]\d{1,2})).*?(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
+]
 
-    # Normalize OCR text
-    df_ocr["line"] = df_ocr["line"].apply(
-        lambda t: re.sub(r"[^A-Za-z0-9\s:/().,&-]", "", str(t))
-    )
 
-    PRICE_PATTERNS = [
+DATE_PATTERNS = [
+re.compile(r"(?P<invoice_date>\d{2}[-/]\d{2}[-/]\d{2,4})"),
+]
 
-    # SKU qty X price total  → "9556268000210 3 X 15.00 45.00"
-    re.compile(r"^(?P<sku>\d{5,})\s+(?P<qty>\d{1,3})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))"),    
+INVOICE_NUMBER_PATTERNS = [
+re.compile(r"(?:T\d+\s+)?(?P<invoice_number>[A-Z]?\d{6,})"),
+]
 
-    # SKU X price total  → "9072363 X 29.90 29.90"
-    re.compile(r"^(?P<sku>\d{5,})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))"),
-    
-    # SKU price qty X total  → "9021937 3.90 1 X 3.90" / "9021937 3.90 1X 3.90"
-    re.compile(r"^(?P<sku>\d{5,})\s+(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
+# Last resort: "SKU X price total" → qty=1, but ONLY if there is no number between SKU and X
+SKU_X_PATTERN = re.compile(
+    r"^(?P<sku>\d{5,})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))$"
+)
 
-    # price qty X total       → "3.90 1 X 3.90"
-    re.compile(r"^(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
+_RECEIPT_CLEAN_RE = re.compile(r"[^A-Za-z0-9\s:/().,&-]")
+_WS_RE = re.compile(r"\s+")
+_SEPARATOR_RE = re.compile(r"[-=]{4,}")
+_ALPHA_RE = re.compile(r"[A-Za-z]")
+_DESC_CHAR_RE = re.compile(r"[\d\-+/]")
 
-    # qty X price total       → "1 X 29.90 29.90" or "1X 8.90 8.90"  (qty max 3 digits)
-    re.compile(r"^(?P<qty>\d{1,3})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
 
-    # price ... qty X total   → "8.98 6942131561408 1X 8.90"
-    re.compile(r"^(?P<price>\d+(?:[.,]\d{1,2})).*?(?P<qty>\d+)\s*(?:X|x)\s*(?P<total>\d+(?:[.,]\d{1,2}))"),
-    ]
+_GLOBAL_FLAGS_RE = re.compile(r"^\(\?[aiLmsux]+\)")
+_SCOPED_FLAGS = ((re.I, "i"), (re.M, "m"), (re.S, "s"), (re.X, "x"), (re.A, "a"))
 
 
-    DATE_PATTERNS = [
-    re.compile(r"(?P<invoice_date>\d{2}[-/]\d{2}[-/]\d{2,4})"),
-    ]
+class PriceRuleSet:
+    """
+    Ordered receipt price-line patterns, compiled once.
 
-    INVOICE_NUMBER_PATTERNS = [
-    re.compile(r"(?:T\d+\s+)?(?P<invoice_number>[A-Z]?\d{6,})"),
-    ]
+    All patterns are also joined into one alternation (group names prefixed with
+    the pattern index), so a single regex call tells whether a line matches any
+    pattern and which one matches first. Patterns are tried in order, like a
+    plain loop over the list.
+    """
 
+    def __init__(self, patterns):
+        self.patterns = [re.compile(p) if isinstance(p, str) else p for p in patterns]
+        alternatives = []
+        for k, pat in enumerate(self.patterns):
+            src = re.sub(r"\(\?P<(\w+)>", rf"(?P<p{k}_\1>", pat.pattern)
+            # a leading "(?i)" can't sit inside the alternation → apply the compiled
+            # flags to this alternative only
+            src = _GLOBAL_FLAGS_RE.sub("", src)
+            flags = "".join(c for flag, c in _SCOPED_FLAGS if pat.flags & flag)
+            if flags:
+                src = f"(?{flags}:{src}\n)" if pat.flags & re.X else f"(?{flags}:{src})"
+            alternatives.append(f"(?P<r{k}>{src})")
+        try:
+            self.combined = re.compile("|".join(alternatives))
+        except re.error:
+            self.combined = None  # patterns that don't combine → one match per pattern
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def first_match(self, s: str):
+        """Index of the first pattern matching s, or None."""
+        if self.combined is None:
+            return next((k for k, pat in enumerate(self.patterns) if pat.match(s)), None)
+        m = self.combined.match(s)
+        return int(m.lastgroup[1:]) if m else None
+
+    def iter_matches(self, s: str):
+        """Yield (index, groupdict) for every pattern matching s, in order."""
+        k = self.first_match(s)
+        if k is None:
+            return
+        for idx in range(k, len(self.patterns)):
+            m = self.patterns[idx].match(s)
+            if m:
+                yield idx, m.groupdict()
 
-    def _match_price_line(line: str):
-        s = re.sub(r"\s+", " ", str(line).strip())
 
-        # ignore totals/tenders
-        if any(w in s.upper() for w in ["TOTAL", "CASH", "CHANGE"]):
-            return None
+PRICE_RULES = PriceRuleSet(PRICE_PATTERNS)
+SUPPLIER_PRICE_PATTERNS = {}   # SUPPLIER KEY (upper) → [compiled patterns]
+_SUPPLIER_PRICE_RULES = {}     # cache of the merged PriceRuleSet per supplier key
 
-        # --- Try regex patterns in order ---
-        for pat in PRICE_PATTERNS:
-            m = pat.match(s)
-            if not m:
-                continue
 
-            g = m.groupdict()
-            qty = (g.get("qty") or "").strip()
-            price = g.get("price")
-            total = g.get("total") or g.get("price")
+def register_price_pattern(pattern, supplier=None):
+    """
+    Add a receipt price-line pattern (named groups: sku, qty, price, total).
+    With supplier, the pattern only applies to receipts whose supplier name
+    contains that text, and is tried before the default patterns.
+    """
+    pat = re.compile(pattern) if isinstance(pattern, str) else pattern
+    # build the new rule set first, so a bad pattern leaves the registry untouched
+    if supplier is None:
+        rules = PriceRuleSet(PRICE_PATTERNS + [pat])
+        global PRICE_RULES
+        PRICE_PATTERNS.append(pat)
+        PRICE_RULES = rules
+    else:
+        key = supplier.strip().upper()
+        PriceRuleSet(SUPPLIER_PRICE_PATTERNS.get(key, []) + [pat] + PRICE_PATTERNS)
+        SUPPLIER_PRICE_PATTERNS.setdefault(key, []).append(pat)
+    _SUPPLIER_PRICE_RULES.clear()
+    return pat
+
+
+def price_rules_for(supplier_name):
+    """PriceRuleSet for a supplier: its own patterns first, then the defaults."""
+    if not supplier_name or not SUPPLIER_PRICE_PATTERNS:
+        return PRICE_RULES
+    u = supplier_name.upper()
+    for key, patterns in SUPPLIER_PRICE_PATTERNS.items():
+        if key in u:
+            if key not in _SUPPLIER_PRICE_RULES:
+                _SUPPLIER_PRICE_RULES[key] = PriceRuleSet(patterns + PRICE_PATTERNS)
+            return _SUPPLIER_PRICE_RULES[key]
+    return PRICE_RULES
+
+
+def _is_noise(line: str) -> bool:
+    u = line.upper()
+    return any(w in u for w in NOISE_WORDS)
+
+
+def _is_header(line: str) -> bool:
+    u = line.upper().strip()
+    if any(w in u for w in HEADER_WORDS):
+        return True
+    if _SEPARATOR_RE.fullmatch(u):
+        return True
+    return False
+
+
+def _norm_num(x):
+    if x is None:
+        return None
+    s = str(x).strip().replace(" ", "")
+    s = s.replace(",", ".")  # unify separators
+
+    try:
+        val = float(s)
+        # Heuristic: if looks too large to be realistic (like >10k) and has no decimal part
+        if val > 10000 and val.is_integer():
+            val = val / 100   # treat as cents
+        return val
+    except ValueError:
+        return None
 
-            # guard: qty that looks like SKU → discard
-            if qty and len(qty) >= 5:
-                qty = ""
 
-            # convert to floats
+def _match_price_line(line: str, rules=None):
+    s = _WS_RE.sub(" ", str(line).strip())
+    rules = rules or PRICE_RULES
+
+    # ignore totals/tenders
+    if any(w in s.upper() for w in ["TOTAL", "CASH", "CHANGE"]):
+        return None
+
+    # --- Try regex patterns in order ---
+    for _, g in rules.iter_matches(s):
+        qty = (g.get("qty") or "").strip()
+        price = g.get("price")
+        total = g.get("total") or g.get("price")
+
+        # guard: qty that looks like SKU → discard
+        if qty and len(qty) >= 5:
+            qty = ""
+
+        # convert to floats
+        try:
+            p = float(price.replace(",", "."))
+            t = float(total.replace(",", "."))
+        except Exception:
+            continue
+
+        # If qty missing OR p * qty doesn't match total, infer qty from total/price
+        qf = None
+        if qty:
             try:
-                p = float(price.replace(",", "."))
-                t = float(total.replace(",", "."))
+                qf = float(qty)
             except Exception:
-                continue
+                qf = None
 
-            # infer qty when missing or inconsistent
-            if not qty:
-                # try to read "Qty(s) : N" nearby (global line check helps when only 1 item)
-                # (optional — simple arithmetic fallback is usually enough)
-                pass
-
-            # If qty missing OR p * qty doesn't match total, infer qty from total/price
-            qf = None
-            if qty:
-                try:
-                    qf = float(qty)
-                except Exception:
-                    qf = None
-
-            if (qf is None) or (p > 0 and abs(t - p * qf) > 0.02):
-                if p > 0:
-                    inferred = t / p
-                    # only accept clean-ish integers
-                    if abs(round(inferred) - inferred) < 0.02 and 0.5 <= inferred <= 999:
-                        qf = float(int(round(inferred)))
-
-            if qf is None:
-                # still no reliable qty → try next pattern
-                continue
+        if (qf is None) or (p > 0 and abs(t - p * qf) > 0.02):
+            if p > 0:
+                inferred = t / p
+                # only accept clean-ish integers
+                if abs(round(inferred) - inferred) < 0.02 and 0.5 <= inferred <= 999:
+                    qf = float(int(round(inferred)))
 
-            return {
-                "sku": g.get("sku"),
-                "qty": str(int(qf)),
-                "unit_price": price,
-                "line_total": total,
-            }
-
-        # --- Last resort: "SKU X price total" → qty=1,
-        # but ONLY if there is no number between SKU and X
-        m_sku_x = re.match(
-            r"^(?P<sku>\d{5,})\s*(?:X|x)\s*(?P<price>\d+(?:[.,]\d{1,2}))\s+(?P<total>\d+(?:[.,]\d{1,2}))$",
-            s,
-        )
-        if m_sku_x:
-            g = m_sku_x.groupdict()
-            return {
-                "sku": g.get("sku"),
-                "qty": "1",
-                "unit_price": g.get("price"),
-                "line_total": g.get("total"),
-            }
+        if qf is None:
+            # still no reliable qty → try next pattern
+            continue
 
-        return None
+        return {
+            "sku": g.get("sku"),
+            "qty": str(int(qf)),
+            "unit_price": price,
+            "line_total": total,
+        }
 
+    # --- Last resort: "SKU X price total" → qty=1,
+    # but ONLY if there is no number between SKU and X
+    m_sku_x = SKU_X_PATTERN.match(s)
+    if m_sku_x:
+        g = m_sku_x.groupdict()
+        return {
+            "sku": g.get("sku"),
+            "qty": "1",
+            "unit_price": g.get("price"),
+            "line_total": g.get("total"),
+        }
 
-    
+    return None
+
+
+class ReceiptLine(NamedTuple):
+    """Per-line features of a receipt, computed once per document."""
+    text: str             # stripped line
+    upper: str            # stripped, upper-cased line
+    is_noise: bool        # totals / tenders / qty summaries
+    is_header: bool       # invoice / GST headers and ---- separators
+    is_price_like: bool   # matches one of the price patterns
+    is_desc_like: bool    # can be part of a product description
+    price: Optional[dict] # parsed price match (sku / qty / unit_price / line_total)
+
+
+def receipt_line_features(lines, rules=None):
+    """One ReceiptLine per OCR line."""
+    rules = rules or PRICE_RULES
+    feats = []
+    for line in lines:
+        text = line.strip()
+        u = text.upper()
+        is_noise = any(w in u for w in NOISE_WORDS)
+        is_price_like = rules.first_match(_WS_RE.sub(" ", text)) is not None
+        feats.append(ReceiptLine(
+            text=text,
+            upper=u,
+            is_noise=is_noise,
+            is_header=any(w in u for w in HEADER_WORDS) or bool(_SEPARATOR_RE.fullmatch(u)),
+            is_price_like=is_price_like,
+            is_desc_like=bool(_ALPHA_RE.search(text) or _DESC_CHAR_RE.search(text)),
+            # every line _match_price_line accepts also matches a price pattern
+            price=_match_price_line(line, rules) if is_price_like and not is_noise else None,
+        ))
+    return feats
+
+
+def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, processed_date, file_path: str):
+
+    # Normalize OCR text
+    df_ocr["line"] = df_ocr["line"].apply(
+        lambda t: _RECEIPT_CLEAN_RE.sub("", str(t))
+    )
 
     # ---------- MAIN EXTRACTION ----------
     def _extract(df_ocr: pd.DataFrame, lookback=6):
         lines = df_ocr["line"].tolist()
+        feats = receipt_line_features(lines)
 
         # -------- SUPPLIER INFO --------
         supplier_name = None
         supplier_tin = None
 
         for i, line in enumerate(lines):
-            u = line.upper().strip()
+            u = feats[i].upper
 
             # Detect supplier name (company header)
             if any(k in u for k in ["BHD SON", "SDN BHD", "SON BHD", "SON BHO", "LTD", "ENTERPRISE", "COMPANY"]):
@@ -502,7 +675,10 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
                 if m:
                     supplier_tin = m.group(1)
 
-
+        # supplier-specific price patterns (if any are registered) → redo the price features
+        rules = price_rules_for(supplier_name)
+        if rules is not PRICE_RULES:
+            feats = receipt_line_features(lines, rules)
 
         # -------- CLIENT ADDRESS --------
         client_address = None
@@ -519,8 +695,8 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
             if supplier_idx is not None:
                 # Scan next few lines for address patterns
                 for j in range(supplier_idx + 1, min(len(lines), supplier_idx + 6)):
-                    line = lines[j].strip()
-                    u = line.upper()
+                    line = feats[j].text
+                    u = feats[j].upper
 
                     # Stop scanning if we reach GST, INVOICE, or TAX section
                     if any(x in u for x in ["GST", "INVOICE", "TAX", "REG", "CO-REG"]):
@@ -542,8 +718,8 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
         # -------- TAX INFO --------
         tax_label = tax_amount = total_amount = None
 
-        for line in lines:
-            u = line.upper().strip()  
+        for line, f in zip(lines, feats):
+            u = f.upper
     
 
             # --- GST summary or tax line ---
@@ -597,7 +773,7 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
                     tax_amount = _norm_num(nums_before_gst[0])
 
                 # detect "TOTAL INCL. GST@6%" or similar
-            if "TOTAL INCL" in line.upper() and re.search(r"\d+[.,]\d+", line):
+            if "TOTAL INCL" in u and re.search(r"\d+[.,]\d+", line):
                 nums = re.findall(r"\d+[.,]\d+", line)
                 if nums:
                     total_amount = _norm_num(nums[-1])
@@ -615,7 +791,7 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
             return any(k in u for k in ["GST", "GST ID", "CO-REG", "CO REG", "COREG", "REG ", "FREE", "ML", "DRILL", "CLAMP", "CLOG"])
 
         for i, line in enumerate(lines):
-            u = line.upper().strip()
+            u = feats[i].upper
 
             # --- date (dd-mm-yy[yy] with optional time) ---
             if not invoice_date:
@@ -661,12 +837,12 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
         # --- Step 2: cross-line fallback (only if still None) ---
         if not invoice_number:
             for i, line in enumerate(lines):
-                u = line.upper().strip()
+                u = feats[i].upper
                 if _bad_context(u):
                     continue
                 # must clearly be an invoice header (avoid short "INV" fragments)
                 if re.fullmatch(r"(INVOICE|INVOICE NO[:#]?|INV NO[:#]?)", u):
-                    nxt = lines[i + 1].strip() if i + 1 < len(lines) else ""
+                    nxt = feats[i + 1].text if i + 1 < len(lines) else ""
                     un = nxt.upper()
                     # reject codes or descriptions
                     if not _bad_context(un) and re.match(r"^[A-Z0-9-]{5,}$", un):
@@ -712,45 +888,24 @@ def extract_product_info(df_ocr: pd.DataFrame, company_id: int, country: str, pr
         
         items = []
 
-        def _is_price_like(line: str) -> bool:
-            s = re.sub(r"\s+", " ", line.strip())
-            return any(pat.match(s) for pat in PRICE_PATTERNS)
-
-        def _is_code_like(line: str) -> bool:
-            t = line.strip()
-            return bool(re.fullmatch(r"[0-9][0-9/\-\s]{5,}", t))
-
-        def _looks_like_desc(line: str) -> bool:
-            u = line.upper().strip()
-            # allow alphanumeric lines (letters or digits), so we don’t drop codes like JH51/3-63 or LG12-24
-            if not re.search(r"[A-Za-z0-9]", u):
-                return False
-            if _is_price_like(u):
-                return False
-            if _is_header(u) or _is_noise(u):
-                return False
-            return True
-
-
-        for i, line in enumerate(lines):
-            if _is_noise(line):
+        for i, f in enumerate(feats):
+            if f.is_noise:
                 continue
-            m = _match_price_line(line)
+            m = f.price
             if not m:
                 continue
 
             desc_lines = []
             for j in range(i - 1, max(0, i - lookback) - 1, -1):
-                cand = lines[j].strip()
-                u = cand.upper()
+                cand = feats[j]
 
                 # stop scanning if we hit totals or headers
-                if _is_header(cand) or _is_price_like(cand):
+                if cand.is_header or cand.is_price_like:
                     break
 
                 # Accept descriptive or semi-code lines (letters, numbers, dashes, plus signs)
-                if re.search(r"[A-Za-z]", cand) or re.search(r"[\d\-+/]", cand):
-                    desc_lines.insert(0, cand)
+                if cand.is_desc_like:
+                    desc_lines.insert(0, cand.text)
                 else:
                     break
 
@@ -838,7 +993,7 @@ def parse_nc_award_letter(text_list, company_id, country, processed_date, file_p
         County:        Craven
         Description:   Work Barge Skyco Drydock
     """
-    full_text = "\n".join(text_list)
+    full_text = full_text_of(text_list)
     state_header, owner_header = extract_nc_header(text_list)
     contract_id = None
     federal_aid_no = None
@@ -956,8 +1111,8 @@ def parse_nc_bids_as_read(text_list, company_id, country, processed_date, file_p
     """
 
 
-    full_text = "\n".join(text_list)
-    lines = [l.strip() for l in text_list if l.strip()]
+    full_text = full_text_of(text_list)
+    lines = stripped_lines_of(text_list)
     # headers
     state_header, owner_header = extract_generic_owner_header(text_list)
 
@@ -1096,40 +1251,31 @@ def parse_nc_bids_as_read(text_list, company_id, country, processed_date, file_p
 
 
 
-def parse_nc_bid_tabs(text_list, company_id, country, processed_date, file_path):
-    """
-    Parser for 'Bid Tabs' da NCDOT 
-    """
-    if not text_list:
-        return [{
-            "company_id": company_id,
-            "country": country,
-            "processed_date": processed_date,
-            "file": file_path,
-            "doc_type": "nc_bid_tabs",
-            "state_header": None,
-            "owner_header": None,
-            "letting_date": None,
-            "contract_id": None,
-            "project_number": None,
-            "proposal_project_type": None,
-            "location": None,
-            "call_number": None,
-            "counties": None,
-            "description_header": None,
-            "line_no": None,
-            "sect_no": None,
-            "item_no": None,
-            "description": None,
-            "qty": None,
-            "unit": None,
-            "bidder_index": None,
-            "bidder_name": None,
-            "unit_price": None,
-            "amount": None,
-        }]
+# Bid tab token classes, one regex pass per line (each token is tried as money,
+# then number, else word):
+#   money: \$?[\d,]+\.\d{2}                       e.g. "$1,234.56", "12.00"
+#   num:   digits once commas are removed, optional decimals  e.g. "380,471", "0.5"
+#   word:  anything else
+_BID_TOKEN_RE = re.compile(
+    r"(?P<money>\$?[\d,]+\.\d{2})(?!\S)"
+    r"|(?P<num>[\d,]*\d[\d,]*(?:\.[\d,]*\d[\d,]*)?)(?!\S)"
+    r"|(?P<word>\S+)"
+)
+_BID_LINE_NO_RE = re.compile(r"\d{3,4}")
+
 
-    full_text = "\n".join(text_list)
+def classify_bid_tokens(line: str):
+    """Split a line into tokens and their classes ("money" / "num" / "word")."""
+    tokens, kinds = [], []
+    for m in _BID_TOKEN_RE.finditer(line):
+        tokens.append(m.group())
+        kinds.append(m.lastgroup)
+    return tokens, kinds
+
+
+def _nc_bid_tabs_header(text_list):
+    """Header fields and bidder names of a bid tab (everything but the item rows)."""
+    full_text = full_text_of(text_list)
     state_header, owner_header = extract_nc_header(text_list)
 
     # ---------- Letting Date (ex.: May 03, 2023) ----------
@@ -1223,8 +1369,7 @@ def parse_nc_bid_tabs(text_list, company_id, country, processed_date, file_path)
 
 
 
-    lines = [re.sub(r"\s+", " ", l.strip()) for l in text_list if l and l.strip()]
-    raw_lines = [l.strip() for l in text_list if l and l.strip()]
+    raw_lines = stripped_lines_of(text_list)
 
     # ---------- bidder names  ----------
     vendor_names = []
@@ -1286,145 +1431,320 @@ def parse_nc_bid_tabs(text_list, company_id, country, processed_date, file_path)
 
     seen = set()
     vendor_names = [v for v in vendor_names if not (v in seen or seen.add(v))]
-    n_bidders = len(vendor_names)
 
-    def _is_money(tok: str) -> bool:
-        return bool(re.fullmatch(r"\$?[\d,]+\.\d{2}", tok))
-    
-    def _is_numeric(tok: str) -> bool:
-        return bool(re.fullmatch(r"\d+(?:\.\d+)?", tok.replace(",", "")))
-    
+    return {
+        "letting_date": letting_date,
+        "contract_id": contract_id,
+        "project_number": project_number,
+        "proposal_project_type": proposal_project_type,
+        "location": location,
+        "call_number": call_number,
+        "counties": counties,
+    }, vendor_names
 
-    records = []
 
-    for line in lines:
-        tokens = line.split()
-        if len(tokens) < 6:
-            continue
 
-        if not re.fullmatch(r"\d{3,4}", tokens[0]):
-            continue
+def _parse_nc_bid_tab_row(line: str, n_bidders: int):
+    """
+    One item row → (line_no, item_no, description, qty, unit, [(unit_price, amount), ...]),
+    or None when the line is not an item row.
+    """
+    tokens, kinds = classify_bid_tokens(line)
+    if len(tokens) < 6:
+        return None
 
-        money_idx = [i for i, t in enumerate(tokens) if _is_money(t)]
-        if len(money_idx) < 2:   
-            continue
+    if not _BID_LINE_NO_RE.fullmatch(tokens[0]):
+        return None
 
-        first_money_idx = money_idx[0]
-        core_tokens = tokens[:first_money_idx]
-        bidder_money_tokens = tokens[first_money_idx:]
-
-        # --- qty + unit dentro de core_tokens ---
-        qty = None
-        unit = None
-        head_tokens = core_tokens
-
-        if len(core_tokens) >= 2:
-            last = core_tokens[-1]
-            prev = core_tokens[-2]
-
-            # caso 1: qty numeric + unit text  → "380,471 SY"
-            if _is_numeric(prev) and not _is_numeric(last):
-                qty = prev
-                unit = last
-                head_tokens = core_tokens[:-2]
-
-            # caso 2: qty textual + unit textual (ex.: "Lump Sum")
-            elif not _is_numeric(prev) and not _is_numeric(last):
-                qty = f"{prev} {last}"
-                unit = None
-                head_tokens = core_tokens[:-2]
-
-            # caso 3: qty numeric  → "890"
-            elif _is_numeric(last):
-                qty = last
-                unit = None
-                head_tokens = core_tokens[:-1]
-
-        line_no = head_tokens[0] if len(head_tokens) > 0 else None
-        item_no = head_tokens[1] if len(head_tokens) > 1 else None
-        description = " ".join(head_tokens[3:]) if len(head_tokens) > 3 else None
-
-        qty_val = None
-        if qty is not None and _is_numeric(qty):
-            try:
-                qty_val = float(qty.replace(",", ""))
-            except Exception:
-                qty_val = None
-        unit_val = unit
-
-        numeric_tokens = [t for t in bidder_money_tokens if _is_money(t)]
-        bidder_pairs = []
-
-        if n_bidders >= 1 and len(numeric_tokens) >= 2 * n_bidders:
-            numeric_tokens = numeric_tokens[-2 * n_bidders:]
-            for i in range(n_bidders):
-                up_tok = numeric_tokens[2 * i]
-                amt_tok = numeric_tokens[2 * i + 1]
-                up_val = parse_float(up_tok)
-                amt_val = parse_float(amt_tok)
-                bidder_pairs.append((up_val, amt_val))
-
-        else:
-            # fallback: assume 1 bidder
-            if len(numeric_tokens) >= 2:
-                up_val = parse_float(numeric_tokens[-2])
-                amt_val = parse_float(numeric_tokens[-1])
-                bidder_pairs.append((up_val, amt_val))
-        for idx_b, (up_val, amt_val) in enumerate(bidder_pairs):
-            bidder_index = idx_b + 1
-            bidder_name = vendor_names[idx_b] if idx_b < len(vendor_names) else None
+    money_idx = [i for i, k in enumerate(kinds) if k == "money"]
+    if len(money_idx) < 2:   
+        return None
 
-            records.append({
-                "company_id": company_id,
-                "country": country,
-                "processed_date": processed_date,
-                "file": file_path,
-                "doc_type": "nc_bid_tabs",
-                "letting_date": letting_date,
-                "contract_id": contract_id,
-                "project_number": project_number,
-                "proposal_project_type": proposal_project_type,
-                "location": location,
-                "call_number": call_number,
-                "counties": counties,
-                "line_no": line_no,
-                "item_no": item_no,
-                "description": description,
-                "qty": qty_val if qty_val is not None else qty,
-                "unit": unit_val,
-                "vendor_name": bidder_name,
-                "unit_price": up_val,
-                "amount": amt_val,
-            })
+    first_money_idx = money_idx[0]
+    core_tokens = tokens[:first_money_idx]
+    core_numeric = [k == "num" for k in kinds[:first_money_idx]]
+
+    # --- qty + unit dentro de core_tokens ---
+    qty = None
+    qty_numeric = False
+    unit = None
+    head_tokens = core_tokens
+
+    if len(core_tokens) >= 2:
+        last = core_tokens[-1]
+        prev = core_tokens[-2]
+        last_numeric, prev_numeric = core_numeric[-1], core_numeric[-2]
+
+        # caso 1: qty numeric + unit text  → "380,471 SY"
+        if prev_numeric and not last_numeric:
+            qty = prev
+            qty_numeric = True
+            unit = last
+            head_tokens = core_tokens[:-2]
+
+        # caso 2: qty textual + unit textual (ex.: "Lump Sum")
+        elif not prev_numeric and not last_numeric:
+            qty = f"{prev} {last}"
+            unit = None
+            head_tokens = core_tokens[:-2]
+
+        # caso 3: qty numeric  → "890"
+        elif last_numeric:
+            qty = last
+            qty_numeric = True
+            unit = None
+            head_tokens = core_tokens[:-1]
+
+    line_no = head_tokens[0] if len(head_tokens) > 0 else None
+    item_no = head_tokens[1] if len(head_tokens) > 1 else None
+    description = " ".join(head_tokens[3:]) if len(head_tokens) > 3 else None
+
+    qty_val = None
+    if qty_numeric:
+        try:
+            qty_val = float(qty.replace(",", ""))
+        except Exception:
+            qty_val = None
+
+    numeric_tokens = [tokens[i] for i in money_idx]
+    bidder_pairs = []
+
+    if n_bidders >= 1 and len(numeric_tokens) >= 2 * n_bidders:
+        numeric_tokens = numeric_tokens[-2 * n_bidders:]
+        for i in range(n_bidders):
+            up_tok = numeric_tokens[2 * i]
+            amt_tok = numeric_tokens[2 * i + 1]
+            up_val = parse_float(up_tok)
+            amt_val = parse_float(amt_tok)
+            bidder_pairs.append((up_val, amt_val))
+
+    else:
+        # fallback: assume 1 bidder
+        if len(numeric_tokens) >= 2:
+            up_val = parse_float(numeric_tokens[-2])
+            amt_val = parse_float(numeric_tokens[-1])
+            bidder_pairs.append((up_val, amt_val))
+
+    return line_no, item_no, description, qty_val if qty_val is not None else qty, unit, bidder_pairs
+
+
+def _nc_bid_tab_records(row, header, vendor_names, company_id, country, processed_date, file_path):
+    line_no, item_no, description, qty, unit, bidder_pairs = row
+    records = []
+    for idx_b, (up_val, amt_val) in enumerate(bidder_pairs):
+        bidder_name = vendor_names[idx_b] if idx_b < len(vendor_names) else None
 
-    if not records:
         records.append({
             "company_id": company_id,
             "country": country,
             "processed_date": processed_date,
             "file": file_path,
             "doc_type": "nc_bid_tabs",
-            "letting_date": letting_date,
-            "contract_id": contract_id,
-            "project_number": project_number,
-            "proposal_project_type": proposal_project_type,
-            "location": location,
-            "call_number": call_number,
-            "counties": counties,
-            "line_no": None,
-            "item_no": None,
-            "description": None,
-            "qty": None,
-            "unit": None,
-            "vendor_name": None,
-            "unit_price": None,
-            "amount": None,
+            **header,
+            "line_no": line_no,
+            "item_no": item_no,
+            "description": description,
+            "qty": qty,
+            "unit": unit,
+            "vendor_name": bidder_name,
+            "unit_price": up_val,
+            "amount": amt_val,
         })
+    return records
+
+
+def _nc_bid_tabs_empty_record(header, company_id, country, processed_date, file_path):
+    return {
+        "company_id": company_id,
+        "country": country,
+        "processed_date": processed_date,
+        "file": file_path,
+        "doc_type": "nc_bid_tabs",
+        **header,
+        "line_no": None,
+        "item_no": None,
+        "description": None,
+        "qty": None,
+        "unit": None,
+        "vendor_name": None,
+        "unit_price": None,
+        "amount": None,
+    }
+
+
+class BidTabResult:
+    """
+    Compact bid tab: header fields stored once, item attributes as columns and
+    unit_price / amount as float arrays of shape (items, bidders). mask marks
+    the (item, bidder) cells the row actually had (rows can fall back to a
+    single bidder). to_records() / to_frame() expand to the long format
+    parse_nc_bid_tabs returns, one row per (item, bidder).
+    """
+
+    ITEM_COLUMNS = ("line_no", "item_no", "description", "qty", "unit")
+
+    def __init__(self, ids, header, vendor_names, items, unit_price, amount, mask):
+        self.ids = ids                    # company_id, country, processed_date, file_path
+        self.header = header              # letting_date, contract_id, ..., counties
+        self.vendor_names = vendor_names  # bidder names, in column order
+        self.items = items                # column name → list, one entry per item
+        self.unit_price = unit_price      # float64 (items, bidders), NaN where mask is False
+        self.amount = amount
+        self.mask = mask
+
+    @classmethod
+    def from_rows(cls, ids, header, vendor_names, rows):
+        """Build from _parse_nc_bid_tab_row results."""
+        rows = list(rows)
+        items = {c: [r[k] for r in rows] for k, c in enumerate(cls.ITEM_COLUMNS)}
+        width = max((len(r[5]) for r in rows), default=0)
+        unit_price = np.full((len(rows), width), np.nan)
+        amount = np.full((len(rows), width), np.nan)
+        mask = np.zeros((len(rows), width), dtype=bool)
+        for i, r in enumerate(rows):
+            for j, (up_val, amt_val) in enumerate(r[5]):
+                unit_price[i, j] = up_val
+                amount[i, j] = amt_val
+                mask[i, j] = True
+        return cls(ids, header, vendor_names, items, unit_price, amount, mask)
+
+    @property
+    def n_items(self):
+        return self.mask.shape[0]
+
+    def __len__(self):
+        """Number of rows in the long format."""
+        return max(1, int(self.mask.sum()))
+
+    def nbytes(self):
+        """Approximate memory of the arrays and item columns (not the strings themselves)."""
+        return (self.unit_price.nbytes + self.amount.nbytes + self.mask.nbytes
+                + sum(8 * len(v) for v in self.items.values()))
+
+    def _bidder_name(self, j):
+        return self.vendor_names[j] if j < len(self.vendor_names) else None
+
+    def to_records(self):
+        """Same list of dicts as parse_nc_bid_tabs."""
+        if not self.mask.any():
+            return [_nc_bid_tabs_empty_record(self.header, **self.ids)]
+        ids = self.ids
+        records = []
+        rows, cols = np.nonzero(self.mask)
+        unit_price = self.unit_price[rows, cols].tolist()
+        amount = self.amount[rows, cols].tolist()
+        for i, j, up_val, amt_val in zip(rows.tolist(), cols.tolist(), unit_price, amount):
+            records.append({
+                "company_id": ids["company_id"],
+                "country": ids["country"],
+                "processed_date": ids["processed_date"],
+                "file": ids["file_path"],
+                "doc_type": "nc_bid_tabs",
+                **self.header,
+                **{c: self.items[c][i] for c in self.ITEM_COLUMNS},
+                "vendor_name": self._bidder_name(j),
+                "unit_price": up_val,
+                "amount": amt_val,
+            })
+        return records
+
+    def to_frame(self):
+        """Long-format DataFrame, built column-wise without per-row dicts."""
+        if not self.mask.any():
+            return pd.DataFrame(self.to_records())
+        ids = self.ids
+        rows, cols = np.nonzero(self.mask)
+        n = len(rows)
+
+        def _repeat(value):
+            return pd.Series([value] * n)
+
+        data = {
+            "company_id": _repeat(ids["company_id"]),
+            "country": _repeat(ids["country"]),
+            "processed_date": _repeat(ids["processed_date"]),
+            "file": _repeat(ids["file_path"]),
+            "doc_type": _repeat("nc_bid_tabs"),
+        }
+        for k, v in self.header.items():
+            data[k] = _repeat(v)
+        for c in self.ITEM_COLUMNS:
+            data[c] = pd.Series(self.items[c]).take(rows).reset_index(drop=True)
+        data["vendor_name"] = pd.Series([self._bidder_name(j) for j in range(self.mask.shape[1])]).take(cols).reset_index(drop=True)
+        data["unit_price"] = self.unit_price[rows, cols]
+        data["amount"] = self.amount[rows, cols]
+        return pd.DataFrame(data)
+
+
+def parse_nc_bid_tabs(text_list, company_id, country, processed_date, file_path, compact=False):
+    """
+    Parser for 'Bid Tabs' da NCDOT 
+    compact=True returns a BidTabResult (items × bidders arrays) instead of
+    one dict per (item, bidder); its to_records() equals the default output.
+    """
+    text_list = text_list or []  # no text → the one placeholder row, in both formats
+
+    header, vendor_names = _nc_bid_tabs_header(text_list)
+    n_bidders = len(vendor_names)
+
+    if compact:
+        rows = (_parse_nc_bid_tab_row(line, n_bidders) for line in text_list)
+        ids = dict(company_id=company_id, country=country, processed_date=processed_date, file_path=file_path)
+        result = BidTabResult.from_rows(ids, header, vendor_names, (r for r in rows if r))
+        print(f"   ➜ NC Bid Tabs parsed {result.n_items} items × {result.mask.shape[1]} bidders")
+        return result
+
+    records = []
+    for line in text_list:
+        row = _parse_nc_bid_tab_row(line, n_bidders)
+        if row:
+            records.extend(_nc_bid_tab_records(row, header, vendor_names, company_id, country,
+                                               processed_date, file_path))
+
+    if not records:
+        records.append(_nc_bid_tabs_empty_record(header, company_id, country, processed_date, file_path))
 
     print(f"   ➜ NC Bid Tabs parsed {len(records)} rows")
     return records
 
 
+def iter_nc_bid_tabs(pages, company_id, country, processed_date, file_path):
+    """
+    Streaming parse_nc_bid_tabs: `pages` is an iterable of per-page line lists
+    (e.g. Document.iter_pages). Pages are buffered only until the first item row
+    shows up; header fields and bidder names come from those pages, and from
+    then on records are yielded page by page without keeping earlier pages.
+    """
+    buffered = []
+    header = vendor_names = None
+    n_rows = 0
+
+    for page in pages:
+        if header is None:
+            buffered.extend(page)
+            # same test as the item rows themselves (row shape doesn't depend on the bidder count)
+            if not any(_parse_nc_bid_tab_row(l, 1) for l in page if l and l.strip()):
+                continue
+            header, vendor_names = _nc_bid_tabs_header(buffered)
+            page, buffered = buffered, None
+
+        for line in page:
+            row = _parse_nc_bid_tab_row(line, len(vendor_names))
+            if row:
+                for record in _nc_bid_tab_records(row, header, vendor_names, company_id, country,
+                                                  processed_date, file_path):
+                    n_rows += 1
+                    yield record
+
+    if header is None:
+        # no item row found while streaming → whatever was buffered gets the batch parse
+        yield from parse_nc_bid_tabs(buffered, company_id, country, processed_date, file_path)
+        return
+
+    if n_rows == 0:
+        yield _nc_bid_tabs_empty_record(header, company_id, country, processed_date, file_path)
+
+
 def extract_generic_owner_header(text_list):
 
 
@@ -1506,8 +1826,8 @@ def parse_nc_item_c(text_list, company_id, country, processed_date, file_path):
             "bid_value": None,
         }]
 
-    full_text = "\n".join(text_list)
-    lines = [l.strip() for l in text_list if l and l.strip()]
+    full_text = full_text_of(text_list)
+    lines = stripped_lines_of(text_list)
 
     upper_full = full_text.upper()
 
@@ -1745,8 +2065,8 @@ def parse_nc_invitation_to_bid(text_list, company_id, country, processed_date, f
             "letting_date": None,
         }]
 
-    full_text = "\n".join(text_list)
-    lines = [l.strip() for l in text_list if l and l.strip()]
+    full_text = full_text_of(text_list)
+    lines = stripped_lines_of(text_list)
 
     # ---------- Headers (STATE + OWNER) ----------
 
@@ -1941,5 +2261,5 @@ def parse_document_by_type(
         "processed_date": processed_date,
         "file": file_path,
         "doc_type": doc_type,
-        "raw_text": "\n".join(text_list) if text_list else None,
+        "raw_text": full_text_of(text_list) if text_list else None,
     }]
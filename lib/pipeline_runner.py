@@ -1,10 +1,23 @@
 from lib.ocr_utils import *
 from lib.parse_utils import *
+from lib.cache_utils import *
+from lib.manifest import IngestManifest
+from lib.parquet_sink import ParquetSink
+from lib.schemas import *
+from lib.document import *
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, deque
+
+try:
+    from IPython.display import display  # a builtin in the notebook, not in scripts or worker processes
+except ImportError:
+    display = print
 
 def detect_doc_type(path: Path, text_list=None) -> str:
 
     name = path.name.lower()
-    text_joined = "\n".join(text_list).lower() if text_list else ""
+    text_joined = lower_text_of(text_list) if text_list else ""
 
     # Award Letter / Notification of Award
     if "award letter" in name or "notification of award" in text_joined:
@@ -20,152 +33,468 @@ def detect_doc_type(path: Path, text_list=None) -> str:
 
     return "invoice"
 
-def extract_lines_from_pdf(path: Path):
+def classify_and_read_pdf(path: Path, cache=None, ocr_cache=None, errors=None, adaptive_ocr=False, min_conf=60,
+                          report=None):
+    """
+    Classify a PDF and return (doc_type, text_list) with only the pages its
+    parser needs (PAGE_BUDGETS). The filename decides the doc type first; the
+    text check for "notification of award" then runs on the budgeted pages only.
+    Pages without a text layer (see probe_page) are OCR'd.
+
+    errors: optional list, appended with a message when pages couldn't be
+            OCR'd (their text is missing from text_list).
+    adaptive_ocr / min_conf / report: as in extract_lines_from_pdf.
+    """
+    with Document(path, cache=cache, ocr=True, ocr_cache=ocr_cache, adaptive_ocr=adaptive_ocr,
+                  min_conf=min_conf) as doc:
+        doc_type = detect_doc_type(path)
+        budget = PAGE_BUDGETS.get(doc_type)
+        text_list = doc.lines(max_pages=budget)
+        if doc_type != "nc_award_letter":
+            doc_type = detect_doc_type(path, text_list=text_list)
+            if budget is not None and PAGE_BUDGETS.get(doc_type) != budget:
+                # reclassified by its text → re-read with the new type's budget
+                text_list = doc.lines(max_pages=PAGE_BUDGETS.get(doc_type))
+        if doc.ocr_failed and errors is not None:
+            pages = ", ".join(str(i + 1) for i in sorted(set(doc.ocr_failed)))
+            errors.append(f"OCR failed on page(s) {pages}")
+        if report is not None:
+            report.update(doc.ocr_report)
+    return doc_type, text_list
+
+
+def extract_pdf_pages(path: Path, cache=None):
+    """
+    Native text lines of each PDF page (no OCR fallback).
+    Returns a list with one list of lines per page.
+    """
+    with Document(path, cache=cache) as doc:
+        return doc.pages()
 
-    lines = []
 
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                lines.extend(text.split("\n"))
-                continue
+def extract_lines_from_pdf(path: Path, ocr_workers=1, cache=None, ocr_cache=None, adaptive_ocr=False,
+                           min_conf=60, report=None):
+    """
+    Extract text lines from a PDF, falling back to OCR for pages without a text layer.
+
+    ocr_workers: max number of textless pages rasterized/OCR'd at the same time for
+                 this document (per-document cap). Pages keep their original order.
+    cache:       optional ExtractionCache; a hit skips PDF parsing and OCR entirely.
+    ocr_cache:   optional OcrCache for the rasterized pages.
+    adaptive_ocr: OCR at 150 DPI first and re-render at 300 DPI only the blocks (or
+                 pages) whose mean word confidence is below min_conf.
+    report:      optional Counter, updated with pages_ocr / pages_escalated /
+                 blocks_escalated (and the probe's probed_native / probed_ocr /
+                 probed_hybrid page counts) so a run can report its totals.
+    """
+    with Document(path, cache=cache, ocr=True, ocr_cache=ocr_cache, ocr_workers=ocr_workers,
+                  adaptive_ocr=adaptive_ocr, min_conf=min_conf) as doc:
+        lines = doc.lines()
+        if doc.ocr_report.get("pages_escalated"):
+            print(f"🔍 {path}: {doc.ocr_report['pages_escalated']}/{doc.ocr_report['pages_ocr']} "
+                  f"OCR'd pages escalated to {doc.resolution} DPI ({doc.ocr_report['blocks_escalated']} blocks)")
+        if report is not None:
+            report.update(doc.ocr_report)
+        return lines
+
+
+def iter_bid_tab_records(path, company_id, country, processed_date, ocr_cache=None):
+    """
+    Stream the records of a (large) NC bid tab PDF page by page: pages are read
+    with Document.iter_pages and parsed by iter_nc_bid_tabs, so neither the
+    text nor the records of the whole document are held in memory.
+    """
+    path = Path(path)
+    with Document(path, ocr=True, ocr_cache=ocr_cache) as doc:
+        pages = (lines for _, lines in doc.iter_pages())
+        yield from iter_nc_bid_tabs(pages, company_id, country, processed_date, path)
+
+
+def process_file(path, company_id, country, processed_date, cache=None, ocr_cache=None, ocr_preprocess=None,
+                 errors=None, adaptive_ocr=False, min_conf=60, report=None):
+    """
+    Extract, classify and parse a single PDF/JPG file.
+    Returns the list of records produced for that file.
+
+    errors: optional list, appended with a message for each part of the file
+            that couldn't be read (failed OCR pages, an image without OCR text);
+            the records parsed from the rest are still returned.
+    adaptive_ocr / min_conf / report: OCR of scanned PDF pages, as in
+            extract_lines_from_pdf.
+    """
+    records = []
+
+    path = Path(path)
+    ext = path.suffix.lower()
+    print(f"\n📂 Processing file: {path}")
+
+    # --- PDF extraction ---
+    if ext == ".pdf":
+        doc_type, text_list = classify_and_read_pdf(path, cache=cache, ocr_cache=ocr_cache, errors=errors,
+                                                    adaptive_ocr=adaptive_ocr, min_conf=min_conf, report=report)
+        print(f"📄 Extracted {len(text_list)} text lines from PDF.")
+        df_img = None
+
+    # --- JPG extraction with OCR ---
+    elif ext in [".jpg", ".jpeg", ".png"]:
+        df_img = read_bbox_and_words(path, ocr_cache=ocr_cache, preprocess=ocr_preprocess)
+        if df_img.empty:
+            print(f"⚠️ No valid OCR text found in {path}")
+            if errors is not None:
+                errors.append("no OCR text found")
+            return records
+
+        df_img = df_img.dropna(subset=["line"])
+        df_img = df_img[df_img["line"].str.strip() != ""]
+        df_img = group_ocr_words(df_img, y_tolerance=10)
+        df_img = df_img[df_img["line"].str.len() > 3]
+
+        print(f"🖼️ Extracted {len(df_img)} full text lines from image: {path}")
+        display(df_img.head(5))
+
+        text_list = df_img["line"].astype(str).tolist()
+
+          # 📦 Try to find and read a matching entity file (.json)
+        entity_path = Path(str(path).replace(".jpg", ".json"))
+        if entity_path.exists():
+            df_entities = read_entities(entity_path)
+            print(f"✅ Loaded entity data from {entity_path.name}:")
+            
+        else:
+            df_entities = pd.DataFrame(columns=["company_id", "address", "date", "total"])
+
+        text_list = df_img["line"].astype(str).tolist()
 
-            try:
-                page_image = page.to_image(resolution=300).original  # PIL.Image
-                ocr_text = pytesseract.image_to_string(page_image)
-                if ocr_text:
-                    lines.extend(ocr_text.split("\n"))
-            except Exception as e:
-                print(f"⚠️ OCR failed on page {page.page_number} of {path}: {e}")
+        # After df_img and text_list extraction
+        
+        df_items = extract_product_info(df_img, company_id=company_id, country=country, processed_date=processed_date, file_path=path)
 
-    return lines
+        if not df_items.empty:
+            df_items["company_id"] = company_id
+            df_items["country"] = country
+            df_items["processed_date"] = processed_date
+            df_items["file"] = path
+            
+#            Append parsed data to records list
+            records.extend(df_items.to_dict(orient="records"))
+        else:
+            print(f"⚠️ No valid product data found in {path}")
 
+        doc_type = detect_doc_type(path, text_list=text_list)
 
-def run_extraction_pipeline(pdf_path, company_id, country, processed_date):
+    else:
+        print(f"⚠️ Unsupported file type: {ext}")
+        return records
+
+    print(f"🔎 Detected doc_type={doc_type}")
+
+    # -------------------------------------------------
+    # DOCS ESPECIALS (NC ...)
+    # -------------------------------------------------
+    if doc_type != "invoice":
+        parsed_records = parse_document_by_type(
+            doc_type=doc_type,
+            text_list=text_list,
+            df_img=df_img,
+            company_id=company_id,
+            country=country,
+            processed_date=processed_date,
+            file_path=path,
+        )
+        print(parsed_records)
+        # debug
+        print(
+            f"   ➜ parse_document_by_type returned "
+            f"{type(parsed_records)}"
+            f"{' len=' + str(len(parsed_records)) if isinstance(parsed_records, list) else ''}"
+        )
+
+        if isinstance(parsed_records, dict):
+            parsed_records = [parsed_records]
+
+        if parsed_records:
+            records.extend(parsed_records)
+
+        return records
+
+
+    # --- Extract metadata & table lines ---
+    metadata = extract_invoice_metadata(text_list)
+    table_lines = extract_table_section(text_list)
+    print(metadata)
+    print(table_lines)
+
+    # --- Parse and append structured lines ---
+    for line in table_lines:
+        parsed = parse_invoice_line(line)
+        if parsed:
+            parsed.update(metadata)
+            parsed.update({
+                "company_id": company_id,
+                "country": country,
+                "processed_date": processed_date,
+                "file": path
+            })
+            records.append(parsed)
+
+    return records
+
+
+def _process_file_safe(path, company_id, country, processed_date, cache=None, ocr_cache=None,
+                       ocr_preprocess=None, adaptive_ocr=False, min_conf=60, report=None):
     """
-    Unified ETL function to extract structured invoice data from PDFs and JPGs.
+    Run process_file, turning any failure into an empty result for that file.
+    Returns (records, error) where error is None on success; failures
+    process_file reports without raising (e.g. OCR'd pages that failed) keep
+    the records of the rest of the file but still set error.
     """
-    records = []
+    errors = []
+    try:
+        records = process_file(path, company_id, country, processed_date, cache=cache, ocr_cache=ocr_cache,
+                               ocr_preprocess=ocr_preprocess, errors=errors, adaptive_ocr=adaptive_ocr,
+                               min_conf=min_conf, report=report)
+    except Exception as e:
+        print(f"❌ Failed to process {path}: {e}")
+        return [], str(e)
+    return records, "; ".join(errors) or None
+
+
+def _process_file_in_worker(path, *args):
+    """
+    _process_file_safe in a pool worker. Returns (records, error, ocr counts):
+    a report Counter passed to the worker wouldn't come back to the caller.
+    """
+    counts = Counter()
+    records, error = _process_file_safe(path, *args, report=counts)
+    return records, error, counts
 
-    for path in pdf_path:
-        path = Path(path)
-        ext = path.suffix.lower()
-        print(f"\n📂 Processing file: {path}")
-
-        # --- PDF extraction ---
-        if ext == ".pdf":
-            text_list = []
-            with pdfplumber.open(path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_list.extend(text.split("\n"))
-            print(f"📄 Extracted {len(text_list)} text lines from PDF.")
-            df_img = None
-
-        # --- JPG extraction with OCR ---
-        elif ext in [".jpg", ".jpeg", ".png"]:
-            df_img = read_bbox_and_words(path)
-            if df_img.empty:
-                print(f"⚠️ No valid OCR text found in {path}")
-                continue
 
-            df_img = df_img.dropna(subset=["line"])
-            df_img = df_img[df_img["line"].str.strip() != ""]
-            df_img = group_ocr_words(df_img, y_tolerance=10)
-            df_img = df_img[df_img["line"].str.len() > 3]
+def _worker_result(result, report):
+    records, error, counts = result
+    if report is not None and counts:
+        report.update(counts)
+    return records, error
 
-            print(f"🖼️ Extracted {len(df_img)} full text lines from image: {path}")
-            display(df_img.head(5))
 
-            text_list = df_img["line"].astype(str).tolist()
+def _manifest_entry(path, records, error):
+    """What the manifest keeps of a file's result: (path, doc_type, row_count, error)."""
+    doc_type = records[0].get("doc_type", "invoice") if records else None
+    return path, doc_type, len(records), error
 
-              # 📦 Try to find and read a matching entity file (.json)
-            entity_path = Path(str(path).replace(".jpg", ".json"))
-            if entity_path.exists():
-                df_entities = read_entities(entity_path)
-                print(f"✅ Loaded entity data from {entity_path.name}:")
-                
-            else:
-                df_entities = pd.DataFrame(columns=["company_id", "address", "date", "total"])
 
-            text_list = df_img["line"].astype(str).tolist()
+def _record_in_manifest(manifest, content_hashes, entry):
+    if manifest is None:
+        return
+    path, doc_type, row_count, error = entry
+    manifest.record(
+        path,
+        content_hash=content_hashes.get(path),
+        doc_type=doc_type,
+        status="error" if error else "ok",
+        row_count=row_count,
+        error=error,
+    )
 
-            # After df_img and text_list extraction
-            
-            df_items = extract_product_info(df_img, company_id=company_id, country=country, processed_date=processed_date, file_path=pdf_path)
-
-            if not df_items.empty:
-                df_items["company_id"] = company_id
-                df_items["country"] = country
-                df_items["processed_date"] = processed_date
-                df_items["file"] = path
-                
-    #            Append parsed data to records list
-                records.extend(df_items.to_dict(orient="records"))
-            else:
-                print(f"⚠️ No valid product data found in {path}")
 
+def _iter_file_results(paths, company_id, country, processed_date, workers=None, cache=None,
+                       ocr_cache=None, ocr_preprocess=None, adaptive_ocr=False, min_conf=60, report=None):
+    """
+    Yield (path, records, error) for each path, in input order.
+    With workers > 1 files run in a process pool, keeping only a bounded
+    number of files in flight so results never pile up in memory.
+
+    If a worker process dies (segfault in a native library, OOM kill...) the
+    pool is recreated and the files that were in flight are rerun one at a
+    time, so the file that kills its worker again is recorded as an error
+    and the run goes on.
+    """
+    if not (workers and workers > 1 and len(paths) > 1):
+        for path in paths:
+            file_records, error = _process_file_safe(path, company_id, country, processed_date, cache, ocr_cache,
+                                                     ocr_preprocess, adaptive_ocr, min_conf, report)
+            yield path, file_records, error
+        return
+
+    print(f"⚙️ Processing {len(paths)} files with {workers} worker processes")
+    args = (company_id, country, processed_date, cache, ocr_cache, ocr_preprocess, adaptive_ocr, min_conf)
+    max_in_flight = workers * 2
+    pending = deque(paths)
+    in_flight = deque()  # (path, future), in submission order
+    suspects = deque()   # (path, result or None) in flight when a worker died
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while pending or in_flight or suspects:
+            if suspects:
+                # one file at a time, so a crash points at its file
+                path, result = suspects.popleft()
+                if result is None:
+                    try:
+                        result = executor.submit(_process_file_in_worker, path, *args).result()
+                    except BrokenProcessPool as e:
+                        print(f"❌ Worker crashed on {path}: {e}")
+                        result = [], f"worker crashed: {e}", None
+                        executor = _restart_pool(executor, workers)
+                yield (path, *_worker_result(result, report))
+                continue
+
+            broken = False
+            while pending and len(in_flight) < max_in_flight:
+                try:
+                    in_flight.append((pending[0], executor.submit(_process_file_in_worker, pending[0], *args)))
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                pending.popleft()
+
+            if not broken:
+                # collect in submission order so the output is deterministic
+                path, future = in_flight[0]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                except Exception as e:
+                    print(f"❌ Worker failed on {path}: {e}")
+                    result = [], str(e), None
+                if not broken:
+                    in_flight.popleft()
+                    yield (path, *_worker_result(result, report))
+                    continue
+
+            print(f"⚠️ A worker process died; rerunning the {len(in_flight)} file(s) in flight one at a time")
+            for path, future in in_flight:
+                done = future.done() and future.exception() is None
+                suspects.append((path, future.result() if done else None))
+            in_flight.clear()
+            executor = _restart_pool(executor, workers)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _restart_pool(executor, workers):
+    executor.shutdown(wait=False, cancel_futures=True)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def iter_extraction_records(paths, company_id, country, processed_date, workers=None, cache=None,
+                            ocr_cache=None, manifest=None, chunk_size=None, ocr_preprocess=None,
+                            ocr_batch_size=None, adaptive_ocr=False, min_conf=60, report=None):
+    """
+    Streaming version of run_extraction_pipeline.
+
+    Yields lists of records as soon as they are ready: one list per file, or
+    lists of at most `chunk_size` records when chunk_size is given. Files with
+    no records yield nothing. Takes the same options as run_extraction_pipeline.
+
+    With a manifest, a file is only recorded once every chunk holding its
+    records has been taken by the consumer (the generator resumed after the
+    yield), so if the consumer fails or the process dies first, the next run
+    processes the file again.
+    """
+    paths = list(paths)
+    hashes = {}
+
+    if manifest is not None:
+        pending = []
+        for path in paths:
+            todo, content_hash = manifest.needs_processing(path)
+            if todo:
+                pending.append(path)
+                hashes[path] = content_hash
+        print(f"📒 Manifest: {len(pending)} new/changed files, {len(paths) - len(pending)} unchanged skipped")
+        paths = pending
+
+    if ocr_batch_size:
+        if ocr_cache is None:
+            print("⚠️ ocr_batch_size needs an ocr_cache to hand the batch results over; OCR'ing per file")
         else:
-            print(f"⚠️ Unsupported file type: {ext}")
+            n_images = warm_ocr_cache(paths, ocr_cache, preprocess=ocr_preprocess, batch_size=ocr_batch_size)
+            print(f"🔠 Batch OCR done for {n_images} images")
+
+    buffer = []
+    unrecorded = deque()  # (records yielded once the file is out, manifest entry)
+    emitted = total = 0
+    for path, file_records, error in _iter_file_results(
+        paths, company_id, country, processed_date, workers=workers, cache=cache, ocr_cache=ocr_cache,
+        ocr_preprocess=ocr_preprocess, adaptive_ocr=adaptive_ocr, min_conf=min_conf, report=report,
+    ):
+        entry = _manifest_entry(path, file_records, error)
+
+        if not chunk_size:
+            if file_records:
+                yield file_records
+            _record_in_manifest(manifest, hashes, entry)
             continue
 
-        doc_type = detect_doc_type(path, text_list=text_list)
-        print(f"🔎 Detected doc_type={doc_type}")
-
-        # -------------------------------------------------
-        # DOCS ESPECIALS (NC ...)
-        # -------------------------------------------------
-        if doc_type != "invoice":
-            parsed_records = parse_document_by_type(
-                doc_type=doc_type,
-                text_list=text_list,
-                df_img=df_img,
-                company_id=company_id,
-                country=country,
-                processed_date=processed_date,
-                file_path=path,
-            )
-            print(parsed_records)
-            # debug
-            print(
-                f"   ➜ parse_document_by_type returned "
-                f"{type(parsed_records)}"
-                f"{' len=' + str(len(parsed_records)) if isinstance(parsed_records, list) else ''}"
-            )
-
-            if isinstance(parsed_records, dict):
-                parsed_records = [parsed_records]
-
-            if parsed_records:
-                records.extend(parsed_records)
+        total += len(file_records)
+        unrecorded.append((total, entry))
+        buffer.extend(file_records)
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[chunk_size:]
+            emitted += chunk_size
+        while unrecorded and unrecorded[0][0] <= emitted:
+            _record_in_manifest(manifest, hashes, unrecorded.popleft()[1])
+
+    if buffer:
+        yield buffer
+    for _, entry in unrecorded:
+        _record_in_manifest(manifest, hashes, entry)
+
+    if ocr_cache is not None and not (workers and workers > 1):
+        print(f"🗃️ OCR cache: {ocr_cache.stats()}")
+
+
+def iter_extraction_frames(paths, company_id, country, processed_date, chunk_size=10_000, typed=False, **kwargs):
+    """
+    Same as iter_extraction_records, but yields a DataFrame per chunk
+    (typed=True: built by records_to_frame with the declared dtypes).
+    """
+    for chunk in iter_extraction_records(paths, company_id, country, processed_date,
+                                         chunk_size=chunk_size, **kwargs):
+        yield records_to_frame(chunk) if typed else pd.DataFrame(chunk)
 
-            continue
 
+def run_extraction_pipeline(pdf_path, company_id, country, processed_date, workers=None, cache=None,
+                            ocr_cache=None, manifest=None, ocr_preprocess=None, ocr_batch_size=None,
+                            typed=False, adaptive_ocr=False, min_conf=60, report=None):
+    """
+    Unified ETL function to extract structured invoice data from PDFs and JPGs.
 
-        # --- Extract metadata & table lines ---
-        metadata = extract_invoice_metadata(text_list)
-        table_lines = extract_table_section(text_list)
-        print(metadata)
-        print(table_lines)
-
-        # --- Parse and append structured lines ---
-        for line in table_lines:
-            parsed = parse_invoice_line(line)
-            if parsed:
-                parsed.update(metadata)
-                parsed.update({
-                    "company_id": company_id,
-                    "country": country,
-                    "processed_date": processed_date,
-                    "file": path
-                })
-                records.append(parsed)
-                
+    workers: number of processes used to handle files in parallel.
+             None / 1 keeps the original one-file-at-a-time behaviour.
+             Records are always merged back in the order of `pdf_path`.
+    cache:   optional ExtractionCache so unchanged PDFs are not parsed again.
+    ocr_cache: optional OcrCache so images already OCR'd are not sent to tesseract again.
+    manifest: optional IngestManifest; files already processed successfully and
+              unchanged since are skipped, and every processed file is recorded
+              (status "error" when it raised or any of its OCR failed, so it's
+              retried on the next run).
+    ocr_preprocess: image preprocessing before OCR of JPG/PNG files; True for
+              DEFAULT_OCR_PREPROCESS or a dict of preprocess_image options.
+    ocr_batch_size: with an ocr_cache, OCR all JPG/PNG files up front in batches of
+              this many images per tesseract run (or one in-process tesserocr engine).
+    typed:   build the DataFrame from each doc type's declared schema (lib.schemas):
+              category / datetime64 / float64 / Int64 columns instead of object ones.
+    adaptive_ocr: OCR scanned PDF pages at 150 DPI first and re-render at 300 DPI
+              only the blocks (or pages) whose mean word confidence is below min_conf.
+    report:  optional Counter, updated with the OCR page counts of every PDF
+              (see extract_lines_from_pdf), also when files run in worker processes.
+
+    For large backfills use iter_extraction_records / iter_extraction_frames
+    instead, which don't hold every record in memory at once.
+    """
+    records = []
+    for file_records in iter_extraction_records(
+        pdf_path, company_id, country, processed_date,
+        workers=workers, cache=cache, ocr_cache=ocr_cache, manifest=manifest,
+        ocr_preprocess=ocr_preprocess, ocr_batch_size=ocr_batch_size,
+        adaptive_ocr=adaptive_ocr, min_conf=min_conf, report=report,
+    ):
+        records.extend(file_records)
 
     # --- Combine results ---
-    df = pd.DataFrame(records)
+    df = records_to_frame(records) if typed else pd.DataFrame(records)
 
 
 
@@ -176,4 +505,3 @@ def run_extraction_pipeline(pdf_path, company_id, country, processed_date):
         print(f"\n✅ Final DataFrame created with {len(df)} total records.")
         display(df.head())
         return df
-    
\ No newline at end of file
@@ -0,0 +1,237 @@
+import math
+import typing
+from datetime import date
+from pathlib import PurePath
+from typing import NamedTuple, NewType, Optional
+
+import pandas as pd
+
+
+# Field annotations → DataFrame dtypes (see schema_dtypes):
+#   Category → category (low-cardinality text: ids, names, headers, file paths)
+#   str      → object (free text)
+#   float    → float64
+#   int      → Int64 (nullable)
+#   date     → datetime64 (strings like "2023-02-01", "02/01/2023", "OCT 13 2023" are parsed)
+Category = NewType("Category", str)
+
+
+class InvoiceRecord(NamedTuple):
+    """One invoice / receipt line (the records without a doc_type)."""
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    supplier_name: Optional[Category] = None
+    supplier_tin: Optional[Category] = None
+    client_name: Optional[Category] = None
+    client_address: Optional[Category] = None
+    client_tin: Optional[Category] = None
+    invoice_number: Optional[Category] = None
+    invoice_date: Optional[date] = None
+    due_date: Optional[date] = None
+    description: Optional[str] = None
+    qty: Optional[float] = None
+    price: Optional[float] = None
+    total: Optional[float] = None
+    tax_label: Optional[Category] = None
+    tax_amount: Optional[float] = None
+    total_amount: Optional[float] = None
+    file: Optional[Category] = None
+
+
+class AwardLetterRecord(NamedTuple):
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    file: Optional[Category] = None
+    doc_type: Optional[Category] = None
+    contract_id: Optional[Category] = None
+    state_header: Optional[Category] = None
+    owner_header: Optional[Category] = None
+    project_number: Optional[Category] = None
+    county: Optional[Category] = None
+    description: Optional[str] = None
+    vendor: Optional[Category] = None
+    letting_date: Optional[date] = None
+    award_value: Optional[float] = None
+
+
+class BidsAsReadRecord(NamedTuple):
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    file: Optional[Category] = None
+    doc_type: Optional[Category] = None
+    state_header: Optional[Category] = None
+    owner_header: Optional[Category] = None
+    letting_date: Optional[date] = None
+    letting_time: Optional[Category] = None
+    contract_id: Optional[Category] = None
+    description: Optional[str] = None
+    counties: Optional[Category] = None
+    engineers_estimate: Optional[float] = None
+    total_bids_received: Optional[int] = None
+    contractor_name: Optional[Category] = None
+    amount_bid: Optional[float] = None
+
+
+class BidTabRecord(NamedTuple):
+    """One item × bidder row of a bid tab; qty stays text ("Lump Sum" or a number)."""
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    file: Optional[Category] = None
+    doc_type: Optional[Category] = None
+    letting_date: Optional[date] = None
+    contract_id: Optional[Category] = None
+    project_number: Optional[Category] = None
+    proposal_project_type: Optional[Category] = None
+    location: Optional[Category] = None
+    call_number: Optional[Category] = None
+    counties: Optional[Category] = None
+    line_no: Optional[Category] = None
+    item_no: Optional[Category] = None
+    description: Optional[str] = None
+    qty: Optional[Category] = None
+    unit: Optional[Category] = None
+    vendor_name: Optional[Category] = None
+    unit_price: Optional[float] = None
+    amount: Optional[float] = None
+
+
+class ItemCRecord(NamedTuple):
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    file: Optional[Category] = None
+    doc_type: Optional[Category] = None
+    state_header: Optional[Category] = None
+    owner_header: Optional[Category] = None
+    letting_date: Optional[date] = None
+    contract_id: Optional[Category] = None
+    project_number: Optional[Category] = None
+    proposal_project_type: Optional[Category] = None
+    proposal_description: Optional[str] = None
+    location: Optional[Category] = None
+    owner_cost_estimate: Optional[float] = None
+    date_available: Optional[date] = None
+    final_completion: Optional[date] = None
+    vendor_name: Optional[Category] = None
+    bid_value: Optional[float] = None
+
+
+class InvitationToBidRecord(NamedTuple):
+    company_id: Optional[int] = None
+    country: Optional[Category] = None
+    processed_date: Optional[date] = None
+    file: Optional[Category] = None
+    doc_type: Optional[Category] = None
+    state_header: Optional[Category] = None
+    owner_header: Optional[Category] = None
+    division: Optional[Category] = None
+    contract_id: Optional[Category] = None
+    proposal_description: Optional[str] = None
+    completion_date: Optional[date] = None
+    letting_date: Optional[date] = None
+
+
+# doc_type → record schema; records without a doc_type are invoice / receipt lines
+RECORD_SCHEMAS = {
+    "invoice": InvoiceRecord,
+    "nc_award_letter": AwardLetterRecord,
+    "nc_bids_as_read": BidsAsReadRecord,
+    "nc_bid_tabs": BidTabRecord,
+    "nc_item_c": ItemCRecord,
+    "nc_invitation_to_bid": InvitationToBidRecord,
+}
+
+
+def _field_kind(annotation):
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    return args[0] if args else annotation
+
+
+_KIND_DTYPES = {Category: "category", str: "object", float: "float64", int: "Int64", date: "datetime64[ns]"}
+
+# schema → {field: Category / str / float / int / date}
+SCHEMA_KINDS = {
+    schema: {f: _field_kind(t) for f, t in typing.get_type_hints(schema).items()}
+    for schema in RECORD_SCHEMAS.values()
+}
+
+
+def schema_dtypes(schema):
+    """{field: pandas dtype} of a record schema."""
+    return {f: _KIND_DTYPES[kind] for f, kind in SCHEMA_KINDS[schema].items()}
+
+
+def _is_null(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return True
+    return isinstance(value, float) and math.isnan(value)
+
+
+def record_schema(record):
+    """Schema of a record dict (None for doc types without one, e.g. "unknown")."""
+    return RECORD_SCHEMAS.get(record.get("doc_type") or "invoice")
+
+
+def to_typed_record(record):
+    """Record dict → its schema's NamedTuple (keys the schema doesn't declare are dropped)."""
+    schema = record_schema(record)
+    if schema is None:
+        raise KeyError(f"no record schema for doc_type={record.get('doc_type')!r}")
+    return schema._make(record.get(f) for f in schema._fields)
+
+
+def _typed_column(name, values, kind):
+    values = [None if _is_null(v) else v for v in values]
+
+    if kind is Category:
+        return pd.Series([None if v is None else str(v) for v in values], dtype=object).astype("category")
+    if kind is float or kind is int:
+        s = pd.Series(values, dtype=object)
+        text = s.map(lambda v: isinstance(v, str))
+        if text.any():  # "1,929,500.00", "$12.00"
+            s[text] = s[text].str.replace(r"[$,\s]", "", regex=True)
+        s = pd.to_numeric(s, errors="coerce")
+        return s.astype("float64") if kind is float else s.round().astype("Int64")
+    if kind is date:
+        s = pd.Series([None if v is None else str(v) for v in values], dtype=object)
+        parsed = pd.to_datetime(s, format="mixed", errors="coerce").astype("datetime64[ns]")
+        lost = parsed.isna() & s.notna()
+        if lost.any():
+            print(f"⚠️ {name}: {int(lost.sum())} value(s) aren't dates → NaT (e.g. {s[lost].iloc[0]!r})")
+        return parsed
+    if kind is str:
+        return pd.Series([v if v is None or isinstance(v, str) else str(v) for v in values], dtype=object)
+    # undeclared, or declared differently by the doc types present (e.g. qty): values as they are
+    return pd.Series([str(v) if isinstance(v, PurePath) else v for v in values], dtype=object)
+
+
+def records_to_frame(records):
+    """
+    Build a DataFrame from pipeline records with each doc type's declared dtypes,
+    column by column (no object-dtype intermediate frame). Rows keep their order;
+    columns are the union of the schemas present, in declaration order. Keys no
+    schema declares, doc types without a schema and columns two doc types declare
+    with different types (invoice qty vs bid tab qty) stay object columns.
+    """
+    n = len(records)
+    columns = {}
+    kinds = {}
+    seen = set()
+    for pos, record in enumerate(records):
+        schema = record_schema(record)
+        if schema not in seen:
+            seen.add(schema)
+            for name, kind in SCHEMA_KINDS[schema].items() if schema is not None else ():
+                columns.setdefault(name, [None] * n)
+                kinds[name] = kind if kinds.get(name, kind) is kind else None
+        for name, value in record.items():
+            col = columns.get(name)
+            if col is None:
+                col = columns[name] = [None] * n
+            col[pos] = value
+
+    return pd.DataFrame({name: _typed_column(name, values, kinds.get(name)) for name, values in columns.items()})
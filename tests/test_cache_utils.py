@@ -0,0 +1,59 @@
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import lib.cache_utils as cache_utils
+from lib.cache_utils import DiskCache, ExtractionCache
+
+
+def test_hit_miss_and_overwrite(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=1000)
+    assert cache.get("aa01") is None
+
+    cache.set("aa01", b"x" * 100)
+    cache.set("aa01", b"y" * 100)
+    assert cache.get("aa01") == b"y" * 100
+    assert cache._size == cache.size_bytes() == 100
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=250)
+    for n, key in enumerate(("aa01", "aa02")):
+        cache.set(key, b"x" * 100)
+        os.utime(cache._entry_path(key), (1_000_000 + n, 1_000_000 + n))
+    assert cache.get("aa01") is not None  # refreshed → aa02 is now the oldest
+
+    cache.set("aa03", b"x" * 100)
+
+    assert cache._size == cache.size_bytes() == 200
+    assert cache.get("aa02") is None
+    assert cache.get("aa01") is not None and cache.get("aa03") is not None
+
+
+def test_size_stays_exact_under_concurrent_writes(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10 ** 9)
+    cache.set("00", b"")
+    keys = [f"{n % 40:04x}" for n in range(400)]  # 40 keys, each written 10 times
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda key: cache.set(key, b"z" * 50), keys))
+
+    assert cache._size == cache.size_bytes() == 40 * 50
+    assert pickle.loads(pickle.dumps(cache))._size == 40 * 50  # the lock doesn't travel
+
+
+def test_extraction_key_hashes_each_file_version_once(tmp_path, monkeypatch):
+    pdf = tmp_path / "letter.pdf"
+    pdf.write_bytes(b"%PDF-1.4 one")
+    hashed = []
+    real_sha256 = cache_utils.file_sha256
+    monkeypatch.setattr(cache_utils, "file_sha256", lambda path: hashed.append(path) or real_sha256(path))
+    cache = ExtractionCache(tmp_path / "cache")
+
+    key = cache.key(pdf, "ocr")
+    assert cache.key(pdf, "ocr") == key and cache.key(pdf, "native") != key
+    assert len(hashed) == 1
+
+    pdf.write_bytes(b"%PDF-1.4 two, changed")
+    assert cache.key(pdf, "ocr") != key
+    assert len(hashed) == 2
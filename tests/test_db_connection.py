@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pgserver = pytest.importorskip("pgserver")
+
+from db_connection import postgres
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    try:
+        srv = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="stop")
+    except Exception as e:
+        pytest.skip(f"can't start a local PostgreSQL: {e}")
+    yield srv
+    srv.cleanup()
+
+
+@pytest.fixture
+def db(server):
+    db = postgres(db_name="postgres", user="postgres", password="", host=str(server.pgdata))
+    with db.conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS invoices, invoices_keys")
+        cur.execute((ROOT / "analytics.sql").read_text())
+    yield db
+    db.conn.close()
+
+
+def _invoice(number, lines, supplier="ACME"):
+    return pd.DataFrame({
+        "company_id": 1,
+        "country": "USA",
+        "supplier_name": supplier,
+        "invoice_number": number,
+        "description": [d for d, _ in lines],
+        "qty": 1.0,
+        "price": [p for _, p in lines],
+        "total": [p for _, p in lines],
+        "file": Path(f"data/{number}.jpg"),
+    })
+
+
+def test_repeated_identical_lines_are_kept_and_reloads_skipped(db):
+    df = _invoice("R1", [("COFFEE", 2.5), ("COFFEE", 2.5), ("COFFEE", 2.5), ("TEA", 1.75)])
+    assert db.insert_dataframe(df, return_counts=True) == (4, 0)
+
+    more = pd.concat([df, _invoice("R2", [("COFFEE", 2.5), ("COFFEE", 2.5)], supplier=None)])
+    assert db.insert_dataframe(more, return_counts=True) == (2, 4)
+    assert db.insert_dataframe(more, return_counts=True) == (0, 6)
+
+    counts = db.fetch_dataframe(
+        "SELECT invoice_number, count(*) AS n FROM invoices GROUP BY 1 ORDER BY 1"
+    )
+    assert counts.to_dict("list") == {"invoice_number": ["R1", "R2"], "n": [4, 2]}
+
+
+def test_missing_unique_index_is_an_error(db):
+    with db.conn.cursor() as cur:
+        cur.execute("DROP INDEX invoices_keys_unique")
+
+    assert db.insert_dataframe(_invoice("R1", [("COFFEE", 2.5)])) == -1
+    assert db.fetch_dataframe("SELECT count(*) AS n FROM invoices")["n"][0] == 0
+
+
+def test_failed_copy_loads_no_batch(db):
+    good = _invoice("R1", [("COFFEE", 2.5)] * 4)
+    bad = good.assign(company_id=None)  # company_id is NOT NULL
+    df = pd.concat([good, bad], ignore_index=True)
+
+    assert db.copy_dataframe(df, batch_size=2) == -1
+    assert db.fetch_dataframe("SELECT count(*) AS n FROM invoices")["n"][0] == 0
+    assert db.copy_dataframe(good, batch_size=2) == 4
@@ -0,0 +1,46 @@
+from collections import Counter
+
+from PIL import Image
+
+import lib.document as document
+from lib.document import Document
+
+
+def _scanned_pdf(path, n_pages):
+    """Image-only PDF (no text layer), like a scanned letting document."""
+    pages = [Image.new("RGB", (200, 260), "white") for _ in range(n_pages)]
+    pages[0].save(path, save_all=True, append_images=pages[1:])
+    return path
+
+
+def test_ocr_report_counts_each_page_once(tmp_path, monkeypatch):
+    pdf = _scanned_pdf(tmp_path / "scan.pdf", 3)
+    monkeypatch.setattr(document.pytesseract, "image_to_string", lambda image, **kw: "BID TABULATION")
+
+    with Document(pdf, ocr=True) as doc:
+        assert doc.lines() == ["BID TABULATION"] * 3
+        assert doc.ocr_report == Counter(pages_ocr=3, probed_ocr=3)
+
+
+def test_ocr_renders_are_not_kept(tmp_path, monkeypatch):
+    pdf = _scanned_pdf(tmp_path / "scan.pdf", 3)
+    monkeypatch.setattr(document.pytesseract, "image_to_string", lambda image, **kw: "ITEM C")
+
+    with Document(pdf, ocr=True) as doc:
+        doc.lines()
+        assert doc._images == {}
+        # an explicit page_image request is still cached
+        assert doc.page_image(0) is doc.page_image(0)
+
+
+def test_renders_are_dropped_on_close_and_by_iter_pages(tmp_path, monkeypatch):
+    pdf = _scanned_pdf(tmp_path / "scan.pdf", 3)
+    monkeypatch.setattr(document.pytesseract, "image_to_string", lambda image, **kw: "BID TABS")
+
+    doc = Document(pdf, ocr=True)
+    doc.page_image(0)
+    doc.page_image(2, resolution=72)
+    for _ in doc.iter_pages(max_pages=1):
+        assert list(doc._images) == [(2, 72)]  # page 0's render went with the page
+    doc.close()
+    assert doc._images == {}
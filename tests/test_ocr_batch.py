@@ -0,0 +1,171 @@
+import csv
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytesseract
+import pytest
+from PIL import Image
+
+import lib.ocr_utils as ocr_utils
+from lib.cache_utils import OcrCache
+
+
+def _ocr_frame(text):
+    return pd.DataFrame({
+        "level": [5], "page_num": [1], "block_num": [1], "par_num": [1], "line_num": [1],
+        "word_num": [1], "left": [10], "top": [10], "width": [40], "height": [12],
+        "conf": [90.0], "text": [text],
+    })
+
+
+def test_failed_batch_falls_back_to_single_images(tmp_path, monkeypatch):
+    good, bad = tmp_path / "good.jpg", tmp_path / "bad.jpg"
+    Image.new("RGB", (60, 30), "white").save(good)
+    Image.new("RGB", (60, 30), "black").save(bad)
+
+    def broken_batch(files):
+        raise pytesseract.TesseractNotFoundError()
+
+    def single(image, output_type=None, **kwargs):
+        if image.getpixel((0, 0)) == (0, 0, 0):
+            raise pytesseract.TesseractError(1, "cannot read image")
+        return _ocr_frame("TOTAL")
+
+    monkeypatch.setattr(ocr_utils, "_batch_image_to_data_tesseract", broken_batch)
+    monkeypatch.setattr(ocr_utils.pytesseract, "image_to_data", single)
+
+    cache = OcrCache(tmp_path / "ocr")
+    frames = ocr_utils.read_bbox_and_words_batch([good, bad], ocr_cache=cache, batch_size=8, engine="tesseract")
+
+    assert frames[0]["line"].tolist() == ["TOTAL"]
+    assert frames[1] is None
+    # the good image is cached, the failed one is left for process_file to retry
+    assert cache.get_data(ocr_utils._ocr_data_key(cache, good, None)) is not None
+    assert cache.get_data(ocr_utils._ocr_data_key(cache, bad, None)) is None
+
+
+def test_warm_ocr_cache_survives_missing_tesseract(tmp_path, monkeypatch):
+    image = tmp_path / "receipt.jpg"
+    Image.new("RGB", (60, 30), "white").save(image)
+
+    def missing(*args, **kwargs):
+        raise pytesseract.TesseractNotFoundError()
+
+    monkeypatch.setattr(ocr_utils, "_batch_image_to_data_tesseract", missing)
+    monkeypatch.setattr(ocr_utils.pytesseract, "image_to_data", missing)
+
+    assert ocr_utils.warm_ocr_cache([image], OcrCache(tmp_path / "ocr"), batch_size=8, engine="tesseract") == 1
+
+
+def _grouped_by_loop(df, y_tolerance=10):
+    """group_ocr_words as it was before vectorizing (iterrows over y0/x0-sorted words)."""
+    df = df.rename(columns={"text": "line"}).sort_values(["y0", "x0"]).reset_index(drop=True)
+    groups, current, last_y = [], [], None
+    for _, row in df.iterrows():
+        if last_y is None or abs(row["y0"] - last_y) <= y_tolerance:
+            current.append(row)
+        else:
+            groups.append(current)
+            current = [row]
+        last_y = row["y0"]
+    groups.append(current)
+    return [" ".join(w["line"] for w in g).strip() for g in groups]
+
+
+def _word_table(words):
+    """(block, par, line, text, x0, y0) tuples → a read_bbox_and_words frame."""
+    return pd.DataFrame([
+        {"filename": "receipt", "x0": x0, "y0": y0, "x2": x0 + 40, "y2": y0 + 12, "line": text,
+         "block_num": block, "par_num": par, "line_num": line, "conf": 90.0}
+        for block, par, line, text, x0, y0 in words
+    ])
+
+
+RECEIPT_WORDS = [
+    (1, 1, 1, "ACME", 10, 10), (1, 1, 1, "STORE", 60, 11),
+    (2, 1, 1, "COFFEE", 10, 40), (2, 1, 1, "2.50", 120, 41),
+    (2, 1, 2, "TEA", 10, 60), (2, 1, 2, "1.75", 120, 60),
+    (3, 1, 1, "TOTAL", 10, 90), (3, 1, 1, "4.25", 120, 90),
+]
+
+
+def test_grouping_matches_the_loop_and_tesseract_lines():
+    words = _word_table(RECEIPT_WORDS)
+    expected = ["ACME STORE", "COFFEE 2.50", "TEA 1.75", "TOTAL 4.25"]
+
+    assert _grouped_by_loop(words) == expected
+    assert ocr_utils.group_ocr_words(words)["line"].tolist() == expected
+    assert ocr_utils.group_ocr_words(words, use_tesseract_lines=True)["line"].tolist() == expected
+
+
+def test_tesseract_lines_keep_words_left_to_right_on_a_skewed_line():
+    words = _word_table(RECEIPT_WORDS[:2] + [(3, 1, 1, "TOTAL", 10, 102), (3, 1, 1, "5.00", 100, 98)])
+
+    merged = ocr_utils.group_ocr_words(words, use_tesseract_lines=True)
+    assert merged["line"].tolist() == ["ACME STORE", "TOTAL 5.00"]
+    # the y0 tolerance path keeps the original loop's order
+    assert ocr_utils.group_ocr_words(words)["line"].tolist() == _grouped_by_loop(words)
+    assert merged[["x0", "y0", "x2", "y2"]].values.tolist()[1] == [10, 98, 140, 114]
+
+
+def _fake_tesseract(image, output_type=None, **kwargs):
+    """image_to_data that reads back what it was handed: one word per image, its mode and first pixel."""
+    if isinstance(image, str):  # list file of the batch path
+        images = [Image.open(f) for f in Path(image).read_text().split()]
+    else:
+        images = [image]
+    rows = [ocr_utils._TSV_HEADER]
+    for n, img in enumerate(images, start=1):
+        word = f"{img.mode}:{img.getpixel((0, 0))}"
+        rows.append(f"5\t{n}\t1\t1\t1\t1\t10\t10\t40\t12\t91.5\t{word}")
+    tsv = ("\n".join(rows) + "\n").encode()
+    if output_type == pytesseract.Output.BYTES:
+        return tsv
+    return pd.read_csv(io.BytesIO(tsv), quoting=csv.QUOTE_NONE, sep="\t")
+
+
+def test_batch_and_single_image_ocr_see_the_same_image(tmp_path, monkeypatch):
+    palette = tmp_path / "palette.png"
+    Image.new("RGB", (60, 30), (200, 30, 30)).convert("P", palette=Image.ADAPTIVE).save(palette)
+    rgba = tmp_path / "rgba.png"
+    Image.new("RGBA", (60, 30), (10, 20, 30, 128)).save(rgba)
+    monkeypatch.setattr(ocr_utils.pytesseract, "image_to_data", _fake_tesseract)
+
+    batch = ocr_utils.read_bbox_and_words_batch([palette, rgba], engine="tesseract")
+    for path, frame in zip([palette, rgba], batch):
+        single = ocr_utils.read_bbox_and_words(path)
+        assert single["line"][0].startswith("RGB:")
+        pd.testing.assert_frame_equal(frame, single)
+
+
+def _ink_box_tesseract(image, output_type=None, **kwargs):
+    """image_to_data reporting one word covering the dark pixels of the image it gets."""
+    ys, xs = np.nonzero(np.asarray(image.convert("L")) < 128)
+    left, top = int(xs.min()), int(ys.min())
+    frame = _ocr_frame("WORD")
+    frame[["left", "top", "width", "height"]] = [[left, top, int(xs.max()) + 1 - left, int(ys.max()) + 1 - top]]
+    return frame
+
+
+@pytest.mark.parametrize("preprocess", [
+    {"target_dpi": 300, "crop_border": True},                 # 600 DPI scan → half size, cropped
+    {"max_side": 500, "binarize": True, "crop_border": True, "border_margin": 3},
+    True,                                                     # DEFAULT_OCR_PREPROCESS
+])
+@pytest.mark.parametrize("suffix", [".png", ".jpg"])
+def test_preprocessed_bboxes_land_in_original_coordinates(tmp_path, monkeypatch, preprocess, suffix):
+    path = tmp_path / f"receipt{suffix}"
+    image = Image.new("RGB", (2000, 1200), "white")
+    image.paste((0, 0, 0), (1200, 400, 1400, 460))  # the "word"
+    image.save(path, dpi=(600, 600), quality=95)
+    monkeypatch.setattr(ocr_utils.pytesseract, "image_to_data", _ink_box_tesseract)
+
+    processed, transform = ocr_utils.preprocess_image(path, **(ocr_utils.DEFAULT_OCR_PREPROCESS
+                                                                if preprocess is True else preprocess))
+    assert processed.size[0] < 2000 and transform["offset_x"] > 0  # really rescaled and cropped
+
+    words = ocr_utils.read_bbox_and_words(path, preprocess=preprocess)
+    box = words[["x0", "y0", "x2", "y2"]].iloc[0].tolist()
+    assert np.allclose(box, [1200, 400, 1400, 460], atol=6), box
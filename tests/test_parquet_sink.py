@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from lib.parquet_sink import ParquetSink
+
+
+def _item_c(**fields):
+    record = {
+        "company_id": 1,
+        "country": "USA",
+        "processed_date": "2026-01-01",
+        "file": Path("data/L230201A_Item C Report.pdf"),
+        "doc_type": "nc_item_c",
+        "contract_id": "DA00564",
+        "letting_date": "2023-02-01",
+        "owner_cost_estimate": "1,929,500.00",
+        "final_completion": "OCT 13 2023",
+        "vendor_name": "LANFORD BROTHERS CO., INC.",
+        "bid_value": 609500.0,
+    }
+    record.update(fields)
+    return record
+
+
+def test_untyped_records_are_coerced_to_the_declared_schema(tmp_path):
+    sink = ParquetSink(tmp_path)
+    sink.write([_item_c(), _item_c(owner_cost_estimate="$12.50", letting_date="02/15/2023")])
+
+    df = sink.read("nc_item_c").sort_values("letting_date").reset_index(drop=True)
+    assert df["owner_cost_estimate"].tolist() == [1929500.0, 12.5]
+    assert df["letting_date"].tolist() == ["2023-02-01", "2023-02-15"]
+    assert str(df["final_completion"][0]) == "2023-10-13"
+    assert df["file"][0] == "data/L230201A_Item C Report.pdf"
+
+
+def test_values_that_dont_fit_raise_instead_of_nulling(tmp_path):
+    sink = ParquetSink(tmp_path)
+    with pytest.raises(ValueError, match="owner_cost_estimate"):
+        sink.write([_item_c(owner_cost_estimate="see addendum")])
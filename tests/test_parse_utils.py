@@ -0,0 +1,199 @@
+import re
+
+import pandas as pd
+import pytest
+
+import lib.parse_utils as pu
+
+
+@pytest.fixture
+def price_registry(monkeypatch):
+    """Register patterns without leaking them into other tests."""
+    monkeypatch.setattr(pu, "PRICE_PATTERNS", list(pu.PRICE_PATTERNS))
+    monkeypatch.setattr(pu, "PRICE_RULES", pu.PriceRuleSet(pu.PRICE_PATTERNS))
+    monkeypatch.setattr(pu, "SUPPLIER_PRICE_PATTERNS", {})
+    monkeypatch.setattr(pu, "_SUPPLIER_PRICE_RULES", {})
+
+
+def test_registered_pattern_keeps_its_flags(price_registry):
+    pu.register_price_pattern(re.compile(r"^pcs\s+(?P<qty>\d+)\s+@\s*(?P<price>\d+\.\d{2})\s+(?P<total>\d+\.\d{2})", re.I))
+    line = "PCS 2 @ 4.50 9.00"
+    assert pu.PRICE_RULES.first_match(line) == len(pu.PRICE_PATTERNS) - 1
+    assert pu._match_price_line(line) == {"sku": None, "qty": "2", "unit_price": "4.50", "line_total": "9.00"}
+
+
+def test_inline_global_flags_register_cleanly(price_registry):
+    n = len(pu.PRICE_PATTERNS)
+    pu.register_price_pattern(r"(?i)^box\s+(?P<qty>\d+)\s+(?P<price>\d+\.\d{2})\s+(?P<total>\d+\.\d{2})")
+    pu.register_price_pattern(r"^tray\s+(?P<qty>\d+)\s+(?P<price>\d+\.\d{2})\s+(?P<total>\d+\.\d{2})")
+    assert len(pu.PRICE_PATTERNS) == n + 2
+    assert pu._match_price_line("BOX 3 1.00 3.00")["qty"] == "3"
+    assert pu._match_price_line("tray 2 1.50 3.00")["qty"] == "2"
+
+
+def test_bad_pattern_leaves_the_registry_untouched(price_registry):
+    n = len(pu.PRICE_PATTERNS)
+    with pytest.raises(re.error):
+        pu.register_price_pattern(r"^(?P<qty>\d+")
+    assert len(pu.PRICE_PATTERNS) == n
+    assert len(pu.PRICE_RULES) == n
+
+
+def test_patterns_that_dont_combine_fall_back_to_one_match_each():
+    rules = pu.PriceRuleSet([r"^(?P<a>\d)(?P=a)$", r"^x$"])
+    assert rules.combined is None
+    assert rules.first_match("11") == 0
+    assert rules.first_match("x") == 1
+    assert rules.first_match("12") is None
+
+
+BID_TAB_PAGES = [
+    [
+        "NORTH CAROLINA DEPARTMENT OF TRANSPORTATION",
+        "BID TABULATION",
+        "LETTING OF February 01, 2023 CONTRACT DA00564",
+        "LINE ITEM SECT DESCRIPTION QTY UNIT",
+    ],
+    [
+        "001 0000100000-N 800 MOBILIZATION Lump Sum $125,000.00 $125,000.00 $98,500.00 $98,500.00",
+        "002 0000400000-N 801 CONSTRUCTION SURVEYING Lump Sum $12,000.00 $12,000.00 $9,900.00 $9,900.00",
+    ],
+    [
+        "003 1121000000-E 560 AGGREGATE BASE COURSE 1,200 TON $35.00 $42,000.00 $38.10 $45,720.00",
+    ],
+]
+
+
+@pytest.mark.parametrize("pages", [
+    BID_TAB_PAGES,
+    BID_TAB_PAGES[:1],                      # header only, no item rows
+    [BID_TAB_PAGES[0] + BID_TAB_PAGES[1]],  # items on the first page
+    [],
+])
+def test_streaming_bid_tabs_match_the_batch_parser(pages):
+    lines = [line for page in pages for line in page]
+    batch = pu.parse_nc_bid_tabs(lines, 1, "USA", "2026-01-01", "bid_tabs.pdf")
+    streamed = list(pu.iter_nc_bid_tabs(iter(pages), 1, "USA", "2026-01-01", "bid_tabs.pdf"))
+    assert streamed == batch
+
+
+def test_three_digit_line_numbers_are_streamed():
+    streamed = list(pu.iter_nc_bid_tabs(iter(BID_TAB_PAGES), 1, "USA", "2026-01-01", "bid_tabs.pdf"))
+    assert list(dict.fromkeys(r["line_no"] for r in streamed)) == ["001", "002", "003"]
+
+
+@pytest.mark.parametrize("lines", [
+    [line for page in BID_TAB_PAGES for line in page],
+    BID_TAB_PAGES[0],  # header only, no item rows
+    [],
+    None,
+])
+def test_compact_bid_tabs_match_the_records(lines):
+    records = pu.parse_nc_bid_tabs(lines, 1, "USA", "2026-01-01", "bid_tabs.pdf")
+    result = pu.parse_nc_bid_tabs(lines, 1, "USA", "2026-01-01", "bid_tabs.pdf", compact=True)
+
+    assert isinstance(result, pu.BidTabResult)
+    assert result.to_records() == records
+    assert len(result) == len(records)
+    assert result.to_frame().columns.tolist() == list(records[0])
+
+
+RECEIPTS = [
+    [
+        "MR. D.I.Y. SDN BHD", "CO-REG : 750441-W", "LOT 1851-A & 1851-B, JALAN KPB 6,",
+        "KAWASAN PERINDUSTRIAN BALAKONG,", "43300 SERI KEMBANGAN, SELANGOR", "GST ID NO : 000306020352",
+        "TAX INVOICE", "INVOICE NO: R000183898", "28-03-18 18:05", "WD-40 ANTI RUST",
+        "9556268000210 3 X 15.00 45.00", "KLEAR PACK 3IN1", "9021937 3.90 1 X 3.90", "ITEM(S) : 2",
+        "TOTAL INCL. GST@6% 48.90", "CASH 50.00", "CHANGE 1.10", "GST SUMMARY AMT(RM) TAX(RM)",
+        "S 6% 46.13 2.77", "THANK YOU",
+    ],
+    [
+        "ABC ENTERPRISE", "GST ID: 001092886528", "INVOICE", "INV12345", "12/03/2018", "PAINT 1L RED",
+        "2 X 4.50 9.00", "DRILL BIT 10MM", "1 X 29.90 29.90", "LG12-24 CLAMP", "8.98 6942131561408 1X 8.90",
+        "----------", "SUBTOTAL 47.80", "GST@6% 2.87", "TOTAL 45.00",
+    ],
+    [
+        "KEDAI RUNCIT", "RECEIPT #: 12345", "FREE GIFT", "10001 X 100 100", "12,50 1 X 12,50",
+        "Rounding 0.01", "VISA",
+    ],
+]
+
+
+def test_price_rules_pick_the_pattern_a_plain_loop_would():
+    lines = {line for receipt in RECEIPTS for line in receipt}
+    lines |= {"9072363 X 29.90 29.90", "1X 8.90 8.90", "3.90 1 X 3.90", "2.55 S@6% 42.45 GST", ""}
+    for line in sorted(lines):
+        s = re.sub(r"\s+", " ", line.strip())
+        loop = next((k for k, pat in enumerate(pu.PRICE_PATTERNS) if pat.match(s)), None)
+        assert pu.PRICE_RULES.first_match(s) == loop, line
+        assert list(pu.PRICE_RULES.iter_matches(s)) == [
+            (k, pat.match(s).groupdict()) for k, pat in enumerate(pu.PRICE_PATTERNS) if pat.match(s)
+        ]
+
+
+# extract_product_info output before the per-line feature table (same for every version since)
+RECEIPT_ITEMS = [
+    [("28-03-18 18:05 WD-40 ANTI RUST", 3.0, 15.0, 45.0), ("KLEAR PACK 3IN1", 1.0, 3.9, 3.9)],
+    [("INV12345 12/03/2018 PAINT 1L RED", 2.0, 4.5, 9.0), ("DRILL BIT 10MM", 1.0, 29.9, 29.9),
+     ("LG12-24 CLAMP", 1.0, 8.98, 8.9)],
+    [("KEDAI RUNCIT RECEIPT : 12345 FREE GIFT 10001 X 100 100", 1.0, 12.5, 12.5)],
+]
+RECEIPT_HEADERS = [
+    ("MR. D.I.Y. SDN BHD", "000306020352", "306020352", "2018-03-28", None, None, 48.9),
+    ("ABC ENTERPRISE", "001092886528", "12345", "2018-03-12", 6.0, 2.87, 47.8),
+    ("KEDAI RUNCIT", None, "12345", None, None, None, 12.5),
+]
+
+
+@pytest.mark.parametrize("lines, items, header", zip(RECEIPTS, RECEIPT_ITEMS, RECEIPT_HEADERS))
+def test_receipt_items_are_unchanged(lines, items, header):
+    df = pu.extract_product_info(pd.DataFrame({"line": lines}), 1, "MY", "2018-03-28", "receipt.jpg")
+
+    assert list(df[["description", "qty", "price", "total"]].itertuples(index=False, name=None)) == items
+    first = df.iloc[0]
+    invoice_date = None if pd.isna(first["invoice_date"]) else str(first["invoice_date"].date())
+    assert (first["supplier_name"], first["supplier_tin"], first["invoice_number"], invoice_date,
+            first["tax_label"], first["tax_amount"], first["total_amount"]) == header
+
+
+# extract_invoice_metadata output of the original line-by-line scanner
+INVOICES = [
+    (
+        ["East Repair Inc.", "1912 Harvest Lane", "INVOICE # US-001", "Invoice Date: 11/02/2019",
+         "Due Date: 26/02/2019", "Bill to", "Ship to", "John Smith", "2 Court Square", "New York, NY 12210",
+         "TIN: 123456789", "QTY DESCRIPTION UNIT PRICE AMOUNT", "1 Front and rear brake cables 100.00 100.00",
+         "Subtotal 145.00", "Sales Tax 6.25% 9.06", "TOTAL $154.06"],
+        {"supplier_name": "East Repair Inc. 1912 Harvest Lane", "supplier_tin": "123456789",
+         "client_name": "John Smith", "client_address": "2 Court Square, New York, NY 12210, TIN: 123456789",
+         "client_tin": "123456789", "invoice_number": None, "invoice_date": "2019-11-02", "due_date": None,
+         "tax_label": None, "tax_amount": None, "total_amount": 154.06},
+    ),
+    (
+        ["MR. D.I.Y. SDN BHD", "CO-REG : 750441-W", "GST ID No :000306020352", "TAX INVOICE", "R000183898",
+         "TOTAL INCL. GST@6% 45.00", "GST SUMMARY AMT(RM) TAX(RM)", "S 6% 42.45 2.55", "CASH 50.00"],
+        {"supplier_name": "MR. D.I.Y. SDN BHD CO-REG : 750441-W", "supplier_tin": None, "client_name": None,
+         "client_address": None, "client_tin": None, "invoice_number": "R000183898", "invoice_date": None,
+         "due_date": None, "tax_label": None, "tax_amount": None, "total_amount": 6.0},
+    ),
+    (
+        # two pages repeating the same "Bill to" block: the first one wins
+        ["ACME LTD", "Page 1", "Bill to", "", "Jane Roe", "1 Main St", "Springfield", "US",
+         "Invoice Date: 2023-05-01", "Sub Total 10.00", "Page 2", "Bill to", "", "Jane Roe", "1 Main St",
+         "Springfield", "US", "Sub Total 20.00", "GST 6% 1.20 20.00", "TOTAL 21.20"],
+        {"supplier_name": "ACME LTD Page 1", "supplier_tin": None, "client_name": "Jane Roe",
+         "client_address": "1 Main St, Springfield, US", "client_tin": None, "invoice_number": None,
+         "invoice_date": "2023-05-01", "due_date": None, "tax_label": 6.0, "tax_amount": 1.2,
+         "total_amount": 21.2},
+    ),
+    (
+        [],
+        {"supplier_name": "", "supplier_tin": None, "client_name": None, "client_address": None,
+         "client_tin": None, "invoice_number": None, "invoice_date": None, "due_date": None,
+         "tax_label": None, "tax_amount": None, "total_amount": None},
+    ),
+]
+
+
+@pytest.mark.parametrize("lines, expected", INVOICES)
+def test_invoice_metadata_is_unchanged(lines, expected):
+    assert pu.extract_invoice_metadata(lines) == expected
@@ -0,0 +1,140 @@
+import builtins
+import multiprocessing
+import os
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+import lib.document as document
+import lib.pipeline_runner as pipeline_runner
+from lib.manifest import IngestManifest
+
+
+def _fake_process_file(path, company_id, country, processed_date, cache=None, ocr_cache=None,
+                       ocr_preprocess=None, errors=None, adaptive_ocr=False, min_conf=60, report=None):
+    if Path(path).name == "crash.pdf":
+        os._exit(1)  # the worker dies, as on a segfault in a native library
+    report.update(pages_ocr=2)
+    return [{"file": str(path), "company_id": company_id}]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="workers must inherit the patched process_file")
+def test_crashing_worker_is_recorded_and_the_run_goes_on(monkeypatch):
+    monkeypatch.setattr(pipeline_runner, "process_file", _fake_process_file)
+    paths = [Path(f"{name}.pdf") for name in ("a", "b", "crash", "c", "d", "e")]
+
+    report = Counter()
+    results = list(pipeline_runner._iter_file_results(paths, 1, "USA", "2026-01-01", workers=2, report=report))
+
+    assert [path for path, _, _ in results] == paths
+    by_name = {path.stem: (records, error) for path, records, error in results}
+    assert by_name["crash"][0] == [] and "crashed" in by_name["crash"][1]
+    for name in ("a", "b", "c", "d", "e"):
+        assert by_name[name] == ([{"file": f"{name}.pdf", "company_id": 1}], None)
+    assert report == Counter(pages_ocr=10)  # counted in the workers, merged back here
+
+
+def _partly_failing_process_file(path, company_id, country, processed_date, cache=None, ocr_cache=None,
+                                 ocr_preprocess=None, errors=None, adaptive_ocr=False, min_conf=60, report=None):
+    name = Path(path).name
+    if name == "raises.pdf":
+        raise RuntimeError("tesseract is not installed")
+    if name == "ocr_failed.pdf":
+        errors.append("OCR failed on page(s) 2")
+    return [{"file": str(path), "company_id": company_id}]
+
+
+def test_manifest_records_failures_as_errors_and_retries_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_runner, "process_file", _partly_failing_process_file)
+    paths = []
+    for name in ("ok.pdf", "raises.pdf", "ocr_failed.pdf"):
+        (tmp_path / name).write_bytes(name.encode())
+        paths.append(tmp_path / name)
+    manifest = IngestManifest(tmp_path / "manifest.sqlite")
+
+    records = [r for chunk in pipeline_runner.iter_extraction_records(paths, 1, "USA", "2026-01-01",
+                                                                       manifest=manifest) for r in chunk]
+    assert [r["file"] for r in records] == [str(paths[0]), str(paths[2])]
+
+    rows = {p.name: manifest.lookup(p) for p in paths}
+    assert {name: (row["status"], row["error"]) for name, row in rows.items()} == {
+        "ok.pdf": ("ok", None),
+        "raises.pdf": ("error", "tesseract is not installed"),
+        "ocr_failed.pdf": ("error", "OCR failed on page(s) 2"),
+    }
+
+    assert [manifest.needs_processing(p)[0] for p in paths] == [False, True, True]
+    manifest.close()
+
+
+def test_failed_pdf_ocr_is_reported(tmp_path, monkeypatch):
+    pdf = tmp_path / "scan.pdf"
+    Image.new("RGB", (200, 260), "white").save(pdf)
+
+    def no_tesseract(image, **kwargs):
+        raise RuntimeError("tesseract is not installed")
+
+    monkeypatch.setattr(document.pytesseract, "image_to_string", no_tesseract)
+
+    records, error = pipeline_runner._process_file_safe(pdf, 1, "USA", "2026-01-01")
+    assert error == "OCR failed on page(s) 1"
+
+
+def test_adaptive_ocr_options_reach_the_document(tmp_path, monkeypatch):
+    pdf = tmp_path / "scan.pdf"
+    Image.new("RGB", (200, 260), "white").save(pdf)
+    words = pd.DataFrame({
+        "block_num": [1, 1], "par_num": [1, 1], "line_num": [1, 1],
+        "left": [10, 60], "top": [10, 10], "width": [40, 40], "height": [12, 12],
+        "conf": [45.0, 50.0], "text": ["INVOICE", "R1"],
+    })
+    monkeypatch.setattr(document.pytesseract, "image_to_data", lambda image, **kw: words)
+
+    report = Counter()
+    df = pipeline_runner.run_extraction_pipeline([pdf], 1, "USA", "2026-01-01", adaptive_ocr=True,
+                                                 min_conf=60, report=report)
+
+    assert df.empty
+    assert report == Counter(pages_ocr=1, pages_escalated=1, probed_ocr=1)
+
+
+def test_files_whose_records_werent_consumed_are_rerun(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_runner, "process_file", _partly_failing_process_file)
+    paths = []
+    for name in ("a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"):
+        (tmp_path / name).write_bytes(name.encode())
+        paths.append(tmp_path / name)
+    manifest = IngestManifest(tmp_path / "manifest.sqlite")
+
+    loaded = []
+    with pytest.raises(RuntimeError, match="database went away"):
+        for chunk in pipeline_runner.iter_extraction_records(paths, 1, "USA", "2026-01-01",
+                                                             manifest=manifest, chunk_size=2):
+            if loaded:
+                raise RuntimeError("database went away")
+            loaded.extend(chunk)
+    assert [r["file"] for r in loaded] == [str(paths[0]), str(paths[1])]
+
+    rerun = [r for chunk in pipeline_runner.iter_extraction_records(paths, 1, "USA", "2026-01-01",
+                                                                     manifest=manifest, chunk_size=2)
+             for r in chunk]
+    assert [r["file"] for r in rerun] == [str(p) for p in paths[2:]]
+    manifest.close()
+
+
+def test_images_are_processed_outside_the_notebook(tmp_path, monkeypatch):
+    image = tmp_path / "receipt.jpg"
+    Image.new("RGB", (200, 100), "white").save(image)
+    words = pd.DataFrame({
+        "filename": "receipt", "x0": [10, 60], "y0": [10, 10], "x2": [50, 100], "y2": [22, 22],
+        "line": ["ACME", "STORE"], "block_num": 1, "par_num": 1, "line_num": 1, "conf": 90.0,
+    })
+    monkeypatch.setattr(pipeline_runner, "read_bbox_and_words", lambda path, **kw: words)
+    assert not hasattr(builtins, "display")  # as in a script or a spawned worker
+
+    records, error = pipeline_runner._process_file_safe(image, 1, "USA", "2026-01-01")
+    assert error is None